@@ -0,0 +1,272 @@
+#! /usr/bin/env python
+# encoding: utf-8
+
+import abc
+import functools
+import importlib.util
+import re
+import unittest
+
+
+"""
+This module parses TOML with the best library available.
+
+A Model needs the tables of a document in the order they are declared.
+The `toml` package announces each table to its decoder as it goes.
+The standard library `tomllib` is faster but has no such hook, so the
+headers of the document are found by a scan which skips over strings,
+comments and values.
+
+"""
+
+
+class InlineTable(dict):
+    "A picklable marker for tables declared inline."
+
+
+class Backend(abc.ABC):
+    "Parse TOML text to its data, and to a map of the tables it declares in document order."
+
+    name = None
+
+    @abc.abstractmethod
+    def loads(self, text):
+        "Return the data of text and a map from the identity of each table it declares to that table."
+
+
+class TomllibBackend(Backend):
+
+    name = "tomllib"
+
+    key = re.compile(
+        r"""[ \t]*(?:(?P<bare>[A-Za-z0-9_-]+)|(?P<basic>"(?:[^"\\\n]|\\.)*")|'(?P<literal>[^'\n]*)')[ \t]*"""
+    )
+    header = (
+        r"""[ \t]*(?P<array>\[)?\[(?:[ \t]*(?P<bare>[A-Za-z0-9_-]+(?:\.[A-Za-z0-9_-]+)*)[ \t]*"""
+        r"""|(?P<key>(?:[^\]\n"']|"(?:[^"\\\n]|\\.)*"|'[^'\n]*')+))\](?(array)\])"""
+        r"""[ \t]*(?:\#[^\n]*)?(?:\r?\n|$)"""
+    )
+    token = re.compile(
+        r'"""(?:[^"\\]|\\.|"(?!""))*"{3,5}'
+        r"|'''.*?'{3,5}"
+        r'|"(?:[^"\\\n]|\\.)*"'
+        r"|'[^'\n]*'"
+        r"|#[^\n]*"
+        r"|(?P<open>[\[{])|(?P<close>[\]}])|(?P<newline>\n)",
+        re.DOTALL
+    )
+
+    string = r"""(?:"(?:[^"\\\n]++|\\.)*+"(?!")|'[^'\n]*+'(?!'))"""
+    flat = rf"""(?:[^\n"'\[\]{{}}\#]++|{string})*+"""
+    simple = (
+        rf"""(?:[ \t]*(?:(?:[^\s"'\[\]{{}}\#]|{string})"""
+        rf"""(?:[^\n"'\[\]{{}}\#]++|{string}|\[{flat}\]|\{{{flat}\}})*+)?(?:\#[^\n]*)?\r?\n)*+"""
+    )
+
+    def __init__(self):
+        import tomllib
+        self.module = tomllib
+        # Possessive quantifiers, like tomllib, need Python 3.11
+        self.simple = re.compile(self.simple)
+        self.block = re.compile(self.simple.pattern + f"(?P<head>{self.header})")
+
+    def keys(self, text):
+        "Split a dotted key into its parts."
+        rv = []
+        pos = 0
+        while True:
+            match = self.key.match(text, pos)
+            if match["bare"] is not None:
+                rv.append(match["bare"])
+            elif match["basic"] is not None:
+                rv.append(self.module.loads(f"k = {match['basic']}")["k"])
+            else:
+                rv.append(match["literal"])
+            pos = match.end()
+            if pos == len(text):
+                return rv
+            pos += 1
+
+    def headers(self, text):
+        "Generate the key of each table header, and whether it is of an array, in document order."
+        for keys, array, start in self.spans(text):
+            yield keys, array
+
+    def spans(self, text, pos=0):
+        """
+        Generate the key of each table header, whether it is of an array, and where it starts.
+        Runs of lines which cannot hide a header are skipped in one match; the
+        tokens of any other line are followed until its values are closed.
+        A scan may begin at `pos` if that is the start of a header, or of the text.
+
+        """
+        depth = 0
+        start = True
+        while True:
+            while start and not depth:
+                match = self.block.match(text, pos)
+                if not match:
+                    pos = self.simple.match(text, pos).end()
+                    break
+                keys = match["bare"].split(".") if match["bare"] else self.keys(match["key"])
+                yield keys, bool(match["array"]), match.start("head")
+                pos = match.end()
+
+            match = self.token.search(text, pos)
+            if not match:
+                return
+            pos = match.end()
+            start = match.lastgroup == "newline"
+            if match.lastgroup == "open":
+                depth += 1
+            elif match.lastgroup == "close":
+                depth -= 1
+
+    def loads(self, text):
+        data = self.module.loads(text)
+        rv = {}
+        arrays = {}
+        for keys, array in self.headers(text):
+            table = data
+            path = ()
+            for n, key in enumerate(keys, start=1):
+                table = table[key]
+                path += (key,)
+                if isinstance(table, list):
+                    if array and n == len(keys):
+                        arrays[path] = arrays.get(path, -1) + 1
+                    index = arrays.get(path, len(table) - 1)
+                    table = table[index]
+                    path += (index,)
+            rv[id(table)] = table
+        return data, rv
+
+
+class TomlBackend(Backend):
+
+    name = "toml"
+
+    def __init__(self):
+        import toml
+
+        class TableDecoder(toml.TomlDecoder):
+            """
+            The parser announces its current table at the start of every line.
+            This decoder records each table in the order the parser enters it.
+
+            """
+
+            def __init__(self, _dict=dict):
+                super().__init__(_dict)
+                self.entered = {}
+
+            def get_empty_inline_table(self):
+                return InlineTable()
+
+            def embed_comments(self, idx, currentlevel):
+                self.entered.setdefault(id(currentlevel), currentlevel)
+
+        self.module = toml
+        self.decoder = TableDecoder
+
+    def loads(self, text):
+        decoder = self.decoder()
+        data = self.module.loads(text + "\n", decoder=decoder)
+        return data, decoder.entered
+
+
+BACKENDS = (TomllibBackend, TomlBackend)
+
+
+@functools.cache
+def backend(name=None):
+    "Return the named backend, or else the first of BACKENDS which can be imported."
+    for cls in BACKENDS:
+        if name in (None, cls.name):
+            try:
+                return cls()
+            except ImportError:
+                if name:
+                    raise
+    raise ValueError(f"No TOML backend {name or ''}")
+
+
+class TestBackends(unittest.TestCase):
+
+    text = """
+    # [Comment]
+    [A.B]
+    label = "[A.C]"
+    tags = [
+        ["x"]
+    ]
+    text = '''
+    [A.D]
+    '''
+    [A]
+    color = {"r" = 0, "g" = 0, "b" = 0}
+    ["A"."e.f"]
+    [ A . 'g' ]  # [A.h]
+    [[A.uses]]
+    target = "B"
+    [[A.uses]]
+    target = "C"
+    [A.uses.D]
+    """
+
+    def backends(self):
+        for cls in BACKENDS:
+            try:
+                yield backend(cls.name)
+            except ImportError:
+                continue
+
+    @unittest.skipUnless(importlib.util.find_spec("tomllib"), "Needs tomllib")
+    def test_headers(self):
+        rv = list(TomllibBackend().headers(self.text))
+        self.assertEqual(
+            [
+                (["A", "B"], False), (["A"], False), (["A", "e.f"], False), (["A", "g"], False),
+                (["A", "uses"], True), (["A", "uses"], True), (["A", "uses", "D"], False),
+            ],
+            rv
+        )
+
+    @unittest.skipUnless(importlib.util.find_spec("tomllib"), "Needs tomllib")
+    def test_spans(self):
+        text = "x = 1\n[A]\n  [ B ]  # c\ny = '[C]'\n"
+        rv = [(keys, text[start:start + 5]) for keys, array, start in TomllibBackend().spans(text)]
+        self.assertEqual([(["A"], "[A]\n "), (["B"], "  [ B")], rv)
+
+    @unittest.skipUnless(importlib.util.find_spec("tomllib"), "Needs tomllib")
+    def test_crlf(self):
+        text = self.text.replace("\n", "\r\n")
+        self.assertEqual(list(TomllibBackend().headers(self.text)), list(TomllibBackend().headers(text)))
+        rv = [text[start:].lstrip()[:4] for keys, array, start in TomllibBackend().spans(text)]
+        self.assertEqual(["[A.B", "[A]\r", '["A"', "[ A ", "[[A.", "[[A.", "[A.u"], rv)
+
+    @unittest.skipUnless(importlib.util.find_spec("tomllib"), "Needs tomllib")
+    def test_comment_brackets(self):
+        text = "x = [ # ]\n  1,\n]\ny = { a = [1] } # [\n[A]\nz = [\n  2, # [\n]\n[B]\n"
+        self.assertEqual([(["A"], False), (["B"], False)], list(TomllibBackend().headers(text)))
+
+    def test_order(self):
+        for parser in self.backends():
+            with self.subTest(backend=parser.name):
+                data, entered = parser.loads(self.text)
+                uses = data["A"]["uses"]
+                self.assertEqual(
+                    [data["A"]["B"], data["A"], data["A"]["e.f"], data["A"]["g"], uses[0], uses[1], uses[1]["D"]],
+                    list(entered.values())[-7:]
+                )
+                self.assertIs(uses[1]["D"], list(entered.values())[-1])
+
+    def test_errors(self):
+        for parser in self.backends():
+            with self.subTest(backend=parser.name):
+                self.assertRaises(ValueError, parser.loads, "[A]\nB = 1\n[A.B]")
+
+    def test_default(self):
+        self.assertIs(backend(), backend())
+        self.assertIn(backend().name, [i.name for i in BACKENDS])
+        self.assertRaises(ValueError, backend, "json")
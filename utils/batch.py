@@ -0,0 +1,165 @@
+#! /usr/bin/env python
+# encoding: utf-8
+
+from collections import Counter
+from collections import namedtuple
+import glob
+import io
+import os
+import pathlib
+import sys
+import tempfile
+import time
+import unittest
+
+
+"""
+This module runs a tool over many files in one invocation.
+
+Files are spread over a pool of processes. A failure in one file is recorded
+against it and does not stop the others. A file is skipped when its output
+is newer than it is.
+
+"""
+
+
+Outcome = namedtuple("Outcome", ["source", "target", "status", "detail", "seconds"])
+
+
+def is_batch(path):
+    return path is not None and (path.is_dir() or any(i in str(path) for i in "*?["))
+
+
+def expand(path, pattern="*.toml"):
+    "Return the files named by a directory or a glob, in sorted order."
+    path = pathlib.Path(path)
+    if path.is_dir():
+        return sorted(i for i in path.glob(pattern) if i.is_file())
+    return sorted(pathlib.Path(i) for i in glob.glob(str(path), recursive=True) if os.path.isfile(i))
+
+
+def stale(source, target):
+    try:
+        return target.stat().st_mtime < source.stat().st_mtime
+    except FileNotFoundError:
+        return True
+
+
+def attempt(func, source, target, *args):
+    start = time.perf_counter()
+    try:
+        detail = func(source, target, *args)
+    except Exception as e:
+        return Outcome(source, target, "failed", str(e) or type(e).__name__, time.perf_counter() - start)
+    return Outcome(source, target, "written", detail, time.perf_counter() - start)
+
+
+def batch(sources, func, target, *args, jobs=None, force=False):
+    """
+    Call func(source, target(source), *args) for each source whose target is stale.
+    Return an Outcome for each source, in order.
+
+    """
+    rv = {}
+    work = []
+    for source in sources:
+        path = target(source)
+        if path.resolve() == source.resolve():
+            rv[source] = Outcome(source, path, "failed", "output would overwrite input", 0)
+        elif force or stale(source, path):
+            work.append((source, path))
+        else:
+            rv[source] = Outcome(source, path, "skipped", None, 0)
+
+    if jobs == 1 or len(work) < 2:
+        rv.update({source: attempt(func, source, path, *args) for source, path in work})
+    else:
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {source: pool.submit(attempt, func, source, path, *args) for source, path in work}
+            for source, future in futures.items():
+                try:
+                    rv[source] = future.result()
+                except Exception as e:
+                    rv[source] = Outcome(source, target(source), "failed", str(e) or type(e).__name__, 0)
+
+    return [rv[source] for source in sources]
+
+
+def summary(outcomes, stream=sys.stderr):
+    "Print each failure and the number of files in each state. Return the number of failures."
+    for outcome in outcomes:
+        if outcome.status == "failed":
+            print(f"{outcome.source}: {outcome.detail}", file=stream)
+
+    counts = Counter(i.status for i in outcomes)
+    seconds = sum(i.seconds for i in outcomes)
+    print(
+        f"{counts['written']} written, {counts['skipped']} up to date, "
+        f"{counts['failed']} failed ({seconds:.2f}s).",
+        file=stream
+    )
+    return counts["failed"]
+
+
+def _upper(source, target):
+    "A task for the tests, kept at module level so that a process pool can pickle it."
+    text = source.read_text()
+    if not text:
+        raise ValueError("empty")
+    target.write_text(text.upper())
+    return len(text)
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.temp = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.temp.name)
+        for name, text in (("a", "[a]"), ("b", ""), ("c", "[c]")):
+            self.path.joinpath(f"{name}.toml").write_text(text)
+        self.path.joinpath("d.txt").write_text("[d]")
+
+    def tearDown(self):
+        self.temp.cleanup()
+
+    def target(self, source):
+        return source.with_suffix(".out")
+
+    def test_expand(self):
+        self.assertTrue(is_batch(self.path))
+        self.assertTrue(is_batch(self.path.joinpath("*.toml")))
+        self.assertFalse(is_batch(self.path.joinpath("a.toml")))
+        self.assertEqual(["a.toml", "b.toml", "c.toml"], [i.name for i in expand(self.path)])
+        self.assertEqual(["d.txt"], [i.name for i in expand(self.path.joinpath("*.txt"))])
+
+    def test_isolation(self):
+        for jobs in (1, 2):
+            with self.subTest(jobs=jobs):
+                rv = batch(expand(self.path), _upper, self.target, jobs=jobs, force=True)
+                self.assertEqual(["written", "failed", "written"], [i.status for i in rv])
+                self.assertEqual("empty", rv[1].detail)
+                self.assertEqual("[C]", self.path.joinpath("c.out").read_text())
+
+    def test_skip_newer(self):
+        sources = expand(self.path)
+        batch(sources, _upper, self.target, jobs=1)
+        later = time.time() + 60
+        os.utime(sources[2], (later, later))
+        rv = batch(sources, _upper, self.target, jobs=1)
+        self.assertEqual(["skipped", "failed", "written"], [i.status for i in rv])
+        rv = batch(sources, _upper, self.target, jobs=1, force=True)
+        self.assertEqual(["written", "failed", "written"], [i.status for i in rv])
+
+    def test_overwrite(self):
+        rv = batch(expand(self.path), _upper, lambda x: x, jobs=1)
+        self.assertTrue(all(i.status == "failed" for i in rv))
+        self.assertEqual("[a]", self.path.joinpath("a.toml").read_text())
+
+    def test_summary(self):
+        rv = batch(expand(self.path), _upper, self.target, jobs=1)
+        stream = io.StringIO()
+        self.assertEqual(1, summary(rv, stream))
+        lines = stream.getvalue().splitlines()
+        self.assertTrue(lines[0].endswith("b.toml: empty"))
+        self.assertTrue(lines[1].startswith("2 written, 0 up to date, 1 failed"))
@@ -0,0 +1,373 @@
+#! /usr/bin/env python
+# encoding: utf-8
+
+import argparse
+import collections
+import dataclasses
+import gc
+import json
+import random
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import unittest
+
+from utils.confuser import Conf
+from utils.toml2dot import Arc
+from utils.toml2dot import Model
+from utils.toml2dot import RGBA
+
+
+"""
+This utility generates synthetic taxonomies and times each stage of
+their rendering.
+
+Usage:
+
+    python -m utils.bench --breadth 8 --depth 4 --arcs 0.5 \
+        --interpolation 0.2 --repeat 3 > bench.json
+
+To compare the memory held by the Nodes of a Model with that of their former layout:
+
+    python -m utils.bench --breadth 10 --depth 4 --memory
+
+To check the start up time of the command line against a budget:
+
+    python -m utils.bench --startup --budget 100
+
+"""
+
+
+def generate(breadth=4, depth=3, arcs=0.5, interpolation=0.1, seed=0):
+    """
+    Generate the text of a taxonomy with `breadth` children under each table,
+    `depth` levels deep. Each table has an arc to a random table with probability
+    `arcs`, and a label interpolated from an earlier table with probability
+    `interpolation`.
+
+    """
+    rng = random.Random(seed)
+    names = []
+    level = [""]
+    for rank in range(depth):
+        level = [f"{parent}{'.' if parent else ''}T{rank}_{n}" for parent in level for n in range(breadth)]
+        names.extend(level)
+    names.sort()
+
+    yield "[DEFAULT]"
+    yield "weight = 1.0"
+    yield ""
+    for n, name in enumerate(names):
+        yield f"[{name}]"
+        ref = rng.randrange(n) if n else None
+        if ref is not None and rng.random() < interpolation:
+            yield f"label = ${{{names[ref]}:label}}"
+        else:
+            yield f'label = "{name.rpartition(".")[2]}"'
+        yield 'color = {"r" = 0, "g" = 0, "b" = 0}'
+        if rng.random() < arcs:
+            yield f"[{name}.a{n}]"
+            yield f'target = "{rng.choice(names)}"'
+        yield ""
+
+
+def consume(lines):
+    collections.deque(lines, maxlen=0)
+
+
+def pipeline(text):
+    "Run each stage in turn, yielding its name and result."
+    conf = Conf.loads(text)
+    yield "Conf.loads", conf
+    literal = conf.dumps()
+    yield "Conf.dumps", literal
+    model = Model.loads(literal)
+    yield "Model.loads", model
+    yield "Model.nodes", model.nodes
+    yield "to_dot", consume(model.to_dot())
+    yield "to_cluster", consume(model.to_cluster())
+
+
+def measure(text, repeat=3):
+    """
+    Time each stage of the pipeline over several runs, then make one more
+    run under tracemalloc to record the peak memory of each stage.
+
+    """
+    stages = collections.defaultdict(dict)
+    for n in range(repeat):
+        start = time.perf_counter()
+        for name, result in pipeline(text):
+            end = time.perf_counter()
+            stages[name].setdefault("seconds", []).append(end - start)
+            start = time.perf_counter()
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for name, result in pipeline(text):
+            stages[name]["peak"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+            if name == "Model.loads":
+                model = result
+    finally:
+        tracemalloc.stop()
+
+    for stage in stages.values():
+        stage["min"] = min(stage["seconds"])
+        stage["median"] = statistics.median(stage["seconds"])
+
+    return dict(
+        counts=dict(
+            bytes=len(text.encode("utf8")),
+            tables=len(model.tables),
+            nodes=len(model.nodes),
+            arcs=sum(len(i.arcs) for i in model.nodes.values()),
+        ),
+        stages=stages
+    )
+
+
+@dataclasses.dataclass
+class Unslotted:
+    "A Node as it was laid out before: a dict per instance, and its own copy of each value."
+
+    name: str
+    label: str = None
+    weight: float = 1.0
+    arcs: list = dataclasses.field(default_factory=list)
+    data: dict = None
+    parent: object = None
+    color: RGBA = None
+    fill: RGBA = None
+    stroke: RGBA = None
+
+
+def unslotted(nodes):
+    "Copy Nodes into the former layout, with no names interned and no colours shared."
+    def fresh(text):
+        return None if text is None else (text + ".")[:-1]
+
+    return {
+        fresh(name): Unslotted(
+            fresh(node.name), fresh(node.label), node.weight,
+            [
+                Arc(fresh(a.label), fresh(a.node), fresh(a.target), a.source, a.weight,
+                    RGBA(*a.color), RGBA(*a.fill), RGBA(*a.stroke))
+                for a in node.arcs
+            ],
+            dict(node.data), fresh(node.parent), RGBA(*node.color), RGBA(*node.fill), RGBA(*node.stroke)
+        )
+        for name, node in nodes.items()
+    }
+
+
+def memory(text):
+    """
+    Record under tracemalloc the memory retained by the Nodes of a Model and the
+    peak while they are built, for the layout of `Model.nodes` and the one it replaced.
+    The text is parsed beforehand, so that only the Nodes are counted.
+
+    """
+    model = Model.loads(text)
+    model.targets
+    model.nodes
+    layouts = (
+        ("slotted", lambda: Model(model.text, model.data, tables=model.tables).nodes),
+        ("unslotted", lambda: unslotted(model.nodes)),
+    )
+    rv = {}
+    for name, build in layouts:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            nodes = build()
+            retained, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        rv[name] = dict(nodes=len(nodes), retained=retained, peak=peak)
+        del nodes
+    rv["ratio"] = rv["slotted"]["retained"] / rv["unslotted"]["retained"]
+    return rv
+
+
+def startup(path, repeat=10):
+    """
+    Time whole runs of `python -m utils.toml2dot` on the file at path, and of
+    the bare interpreter for comparison. The overhead of the tool is the
+    difference between the quickest of each.
+
+    """
+    rv = {}
+    cwd = pathlib.Path(__file__).parent.parent
+    for name, args in (
+        ("python", ["-c", "pass"]),
+        ("toml2dot", ["-m", "utils.toml2dot", "--no-cache", str(path)]),
+    ):
+        seconds = []
+        for n in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, *args], cwd=cwd, stdout=subprocess.DEVNULL, check=True)
+            seconds.append(time.perf_counter() - start)
+        rv[name] = dict(min=min(seconds), median=statistics.median(seconds))
+    rv["overhead"] = rv["toml2dot"]["min"] - rv["python"]["min"]
+    return rv
+
+
+class TestGenerate(unittest.TestCase):
+
+    def test_generate_counts(self):
+        text = "\n".join(generate(breadth=3, depth=2, arcs=0, interpolation=0))
+        model = Model.loads(Conf.loads(text).dumps())
+        self.assertEqual(12, len(model.nodes))
+        self.assertEqual(3, len(model.hierarchy[None]))
+        self.assertFalse(any(i.arcs for i in model.nodes.values()))
+
+    def test_generate_arcs(self):
+        text = "\n".join(generate(breadth=3, depth=2, arcs=1, interpolation=0))
+        model = Model.loads(Conf.loads(text).dumps())
+        self.assertEqual(12, len(model.nodes))
+        self.assertTrue(all(len(i.arcs) == 1 for i in model.nodes.values()))
+        self.assertTrue(all(i.arcs[0].target in model.nodes for i in model.nodes.values()))
+
+    def test_generate_interpolation(self):
+        text = "\n".join(generate(breadth=3, depth=2, arcs=0, interpolation=1))
+        self.assertEqual(11, text.count("${"))
+        model = Model.loads(Conf.loads(text).dumps())
+        self.assertTrue(all(i.label == "T0_0" for i in model.nodes.values() if i.name != "T0_0"))
+
+    def test_generate_seed(self):
+        self.assertEqual(list(generate(seed=1)), list(generate(seed=1)))
+        self.assertNotEqual(list(generate(seed=1)), list(generate(seed=2)))
+
+    def test_measure(self):
+        text = "\n".join(generate(breadth=2, depth=2))
+        rv = measure(text, repeat=2)
+        self.assertEqual(6, rv["counts"]["nodes"])
+        self.assertEqual(
+            ["Conf.loads", "Conf.dumps", "Model.loads", "Model.nodes", "to_dot", "to_cluster"],
+            list(rv["stages"])
+        )
+        self.assertTrue(all(len(i["seconds"]) == 2 for i in rv["stages"].values()))
+        self.assertTrue(all(i["peak"] > 0 for i in rv["stages"].values()))
+        self.assertTrue(json.dumps(rv))
+
+    def test_memory(self):
+        text = Conf.loads("\n".join(generate(breadth=4, depth=3, arcs=1))).dumps()
+        rv = memory(text)
+        self.assertEqual(84, rv["slotted"]["nodes"])
+        self.assertEqual(84, rv["unslotted"]["nodes"])
+        self.assertLess(rv["slotted"]["retained"], rv["unslotted"]["retained"])
+        self.assertTrue(json.dumps(rv))
+
+    def test_startup(self):
+        with tempfile.TemporaryDirectory() as parent:
+            path = pathlib.Path(parent, "bench.toml")
+            path.write_text(Conf.loads("\n".join(generate(breadth=2, depth=2))).dumps())
+            rv = startup(path, repeat=1)
+        self.assertGreater(rv["toml2dot"]["min"], rv["overhead"])
+
+
+def main(args):
+    if args.test:
+        suite = unittest.defaultTestLoader.loadTestsFromName("__main__")
+        unittest.TextTestRunner().run(suite)
+        return 0
+    else:
+        text = "\n".join(generate(
+            breadth=args.breadth, depth=args.depth,
+            arcs=args.arcs, interpolation=args.interpolation, seed=args.seed
+        ))
+
+    if args.generate:
+        print(text, file=sys.stdout)
+        return 0
+
+    if args.startup:
+        with tempfile.TemporaryDirectory() as parent:
+            path = pathlib.Path(parent, "bench.toml")
+            path.write_text(Conf.loads(text).dumps())
+            rv = startup(path, repeat=args.repeat)
+        rv["budget"] = args.budget / 1000
+        print(json.dumps(rv, indent=None if args.compact else 2), file=sys.stdout)
+        return 0 if rv["overhead"] <= rv["budget"] else 1
+
+    if args.memory:
+        rv = memory(Conf.loads(text).dumps())
+        print(json.dumps(rv, indent=None if args.compact else 2), file=sys.stdout)
+        return 0
+
+    rv = measure(text, repeat=args.repeat)
+    rv["parameters"] = {
+        k: getattr(args, k) for k in ("breadth", "depth", "arcs", "interpolation", "seed", "repeat")
+    }
+    print(json.dumps(rv, indent=None if args.compact else 2), file=sys.stdout)
+    return 0
+
+
+def parser():
+    rv = argparse.ArgumentParser(__doc__)
+    rv.add_argument(
+        "--breadth", default=4, type=int,
+        help="Set the number of children of each table."
+    )
+    rv.add_argument(
+        "--depth", default=3, type=int,
+        help="Set the number of levels of tables."
+    )
+    rv.add_argument(
+        "--arcs", default=0.5, type=float,
+        help="Set the probability of an arc from each table."
+    )
+    rv.add_argument(
+        "--interpolation", default=0.1, type=float,
+        help="Set the probability of an interpolated label in each table."
+    )
+    rv.add_argument(
+        "--seed", default=0, type=int,
+        help="Set the seed for random choices."
+    )
+    rv.add_argument(
+        "--repeat", default=3, type=int,
+        help="Set the number of timed runs."
+    )
+    rv.add_argument(
+        "--compact", default=False, action="store_true",
+        help="Print the report without indentation."
+    )
+    rv.add_argument(
+        "--generate", default=False, action="store_true",
+        help="Print the generated taxonomy instead of a report."
+    )
+    rv.add_argument(
+        "--startup", default=False, action="store_true",
+        help="Time the start up of utils.toml2dot instead of each stage."
+    )
+    rv.add_argument(
+        "--memory", default=False, action="store_true",
+        help="Compare the memory held by Nodes in their compact and former layouts."
+    )
+    rv.add_argument(
+        "--budget", default=100, type=float,
+        help="Set the start up time in ms allowed above that of the interpreter [100]."
+    )
+    rv.add_argument(
+        "--test", default=False, action="store_true",
+        help="Run unit tests."
+    )
+    return rv
+
+
+def run():
+    p = parser()
+    args = p.parse_args()
+    rv = main(args)
+    sys.exit(rv)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,222 @@
+#! /usr/bin/env python
+# encoding: utf-8
+
+import contextlib
+import hashlib
+import os
+import pathlib
+import pickle
+import tempfile
+import unittest
+
+
+"""
+This module provides an on-disk cache of parsed objects, addressed by the
+content of the text they were parsed from.
+
+"""
+
+
+class Cache:
+
+    @staticmethod
+    def default_path():
+        root = os.environ.get("XDG_CACHE_HOME") or pathlib.Path.home().joinpath(".cache")
+        return pathlib.Path(root).joinpath("uncarved")
+
+    @staticmethod
+    def digest(*args):
+        rv = hashlib.sha256()
+        for arg in args:
+            rv.update(arg.encode("utf8") if isinstance(arg, str) else arg)
+            rv.update(b"\0")
+        return rv.hexdigest()
+
+    def __init__(self, path=None, version="", limit=2 ** 26):
+        self.path = pathlib.Path(path or self.default_path())
+        self.version = version
+        self.limit = limit
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text):
+        return self.digest(self.version, text)
+
+    def get(self, text, default=None):
+        path = self.path.joinpath(f"{self.key(text)}.pickle")
+        try:
+            with open(path, "rb") as data:
+                rv = pickle.load(data)
+            os.utime(path)
+        except Exception:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return rv
+
+    def put(self, text, obj):
+        "Store obj for text, and return its path. An object too big for the limit is not stored."
+        payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.limit:
+            return None
+
+        path = self.path.joinpath(f"{self.key(text)}.pickle")
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            fd, temp = tempfile.mkstemp(suffix=".tmp", dir=self.path)
+        except OSError:
+            return None
+
+        try:
+            with open(fd, "wb") as data:
+                data.write(payload)
+            os.replace(temp, path)
+        except BaseException:
+            os.unlink(temp)
+            raise
+
+        self.evict()
+        return path
+
+    def open(self, text):
+        "Return a binary file of the raw bytes stored for text by `writer`, or None."
+        path = self.path.joinpath(f"{self.key(text)}.raw")
+        try:
+            rv = open(path, "rb")
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return rv
+
+    @contextlib.contextmanager
+    def writer(self, text):
+        """
+        Provide a binary file to be stored for text as it is written, without holding it in memory.
+        It is kept only if the block completes and the file is within the limit.
+
+        """
+        path = self.path.joinpath(f"{self.key(text)}.raw")
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            fd, temp = tempfile.mkstemp(suffix=".tmp", dir=self.path)
+        except OSError:
+            with open(os.devnull, "wb") as data:
+                yield data
+            return
+
+        try:
+            with open(fd, "wb") as data:
+                yield data
+                size = data.tell()
+            if size > self.limit:
+                os.unlink(temp)
+                return
+            os.replace(temp, path)
+        except BaseException:
+            os.unlink(temp)
+            raise
+
+        self.evict()
+
+    def evict(self):
+        "Remove the least recently used entries until the cache fits within its limit."
+        entries = []
+        for path in self.path.iterdir():
+            if path.suffix not in (".pickle", ".raw"):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for mtime, size, path in entries)
+        rv = []
+        for mtime, size, path in sorted(entries):
+            if total <= self.limit:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            rv.append(path)
+        return rv
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.temp.name)
+
+    def tearDown(self):
+        self.temp.cleanup()
+
+    def test_miss_and_hit(self):
+        cache = Cache(self.path, version="1")
+        self.assertIsNone(cache.get("[A]"))
+        cache.put("[A]", {"A": {}})
+        self.assertEqual({"A": {}}, cache.get("[A]"))
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+    def test_version(self):
+        Cache(self.path, version="1").put("[A]", {"A": {}})
+        cache = Cache(self.path, version="2")
+        self.assertIsNone(cache.get("[A]"))
+
+    def test_corrupt(self):
+        cache = Cache(self.path)
+        cache.put("[A]", {"A": {}})
+        for path in self.path.glob("*.pickle"):
+            path.write_bytes(b"junk")
+        self.assertIsNone(cache.get("[A]"))
+
+    def test_evict(self):
+        cache = Cache(self.path, limit=0)
+        cache.put("[A]", list(range(64)))
+        self.assertEqual([], list(self.path.iterdir()))
+
+    def test_too_big(self):
+        cache = Cache(self.path)
+        path = cache.put("[A]", list(range(64)))
+        cache.limit = path.stat().st_size * 2
+        self.assertIsNone(cache.put("[B]", list(range(1024))))
+        self.assertEqual([path], list(self.path.iterdir()))
+
+    def test_evict_oldest(self):
+        cache = Cache(self.path)
+        for n, text in enumerate(("[A]", "[B]", "[C]")):
+            path = cache.put(text, list(range(64)))
+            os.utime(path, (n, n))
+        size = path.stat().st_size
+        cache.limit = 2 * size
+        cache.evict()
+        self.assertIsNone(cache.get("[A]"))
+        self.assertIsNotNone(cache.get("[B]"))
+        self.assertIsNotNone(cache.get("[C]"))
+
+    def test_writer(self):
+        cache = Cache(self.path, limit=8)
+        self.assertIsNone(cache.open("[A]"))
+        with cache.writer("[A]") as data:
+            data.write(b"digraph")
+        with cache.writer("[B]") as data:
+            data.write(b"digraph {}")
+        with cache.open("[A]") as data:
+            self.assertEqual(b"digraph", data.read())
+        self.assertIsNone(cache.open("[B]"))
+        self.assertFalse(list(self.path.glob("*.tmp")))
+
+    def test_writer_failure(self):
+        cache = Cache(self.path)
+        with self.assertRaises(ValueError):
+            with cache.writer("[A]") as data:
+                data.write(b"digraph")
+                raise ValueError
+        self.assertIsNone(cache.open("[A]"))
+        self.assertEqual([], list(self.path.iterdir()))
@@ -3,12 +3,26 @@
 
 import argparse
 import configparser
+from collections import defaultdict
+from collections import deque
+import contextlib
+import functools
+import io
 import itertools
 import pathlib
 import re
 import sys
+import tempfile
+import textwrap
 import unittest
 
+from utils.batch import batch
+from utils.batch import expand
+from utils.batch import is_batch
+from utils.batch import summary
+from utils.cache import Cache
+from utils.profiler import Profiler
+
 
 """
 This utility applies configparser substitution patterns as a preprocessor
@@ -19,8 +33,199 @@ Usage:
     python -m utils.confuser design/taxonomy.toml | \
     python -m utils.toml2dot > design/taxonomy.dot
 
+Given a directory or a glob, write each file to an output directory:
+
+    python -m utils.confuser --output build/design "design/*.toml"
+
+To write each section as soon as it can be resolved, without reading all
+the input first:
+
+    python -m utils.confuser --stream huge.toml | python -m utils.toml2dot
+
 """
 
+class InterpolationCycleError(configparser.InterpolationDepthError):
+    "A chain of substitutions which leads back to where it started."
+
+    def __init__(self, path):
+        section, option = path[0]
+        msg = "Substitutions form a cycle: {0}".format(" -> ".join(f"${{{s}:{o}}}" for s, o in path))
+        configparser.InterpolationError.__init__(self, option, section, msg)
+        self.path = path
+
+
+class Resolver:
+    """
+    Resolve the substitutions of a ConfigParser as does ExtendedInterpolation,
+    but each value only once.
+
+    Every raw value is parsed once into its text and references. A value is
+    resolved after all those it refers to, by a depth-first walk of the graph
+    of references, and kept. The graph is recorded in reverse, so that when
+    a value changes, only those which depend on it are resolved again. Each
+    value forgotten leaves the graph, so that it holds only what is kept.
+
+    A default whose references all name their section has the same value in
+    every section which does not set it, so it is resolved and kept once, not
+    once for each section.
+
+    """
+
+    reference = re.compile(r"\$\{([^}]+)\}")
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.parsed = {}
+        self.values = {}
+        self.users = defaultdict(set)
+        self.refers = defaultdict(set)
+
+    def raw(self, section, option):
+        if section != self.parser.default_section:
+            try:
+                return self.parser._sections[section][option]
+            except KeyError:
+                if section not in self.parser._sections:
+                    raise configparser.NoSectionError(section) from None
+        return self.parser._defaults[option]
+
+    def parse(self, section, option, value):
+        "Split a raw value into text and the (section, option) of each reference."
+        try:
+            return self.parsed[value]
+        except KeyError:
+            pass
+
+        rv = []
+        rest = value
+        while rest:
+            p = rest.find("$")
+            if p < 0:
+                rv.append(rest)
+                break
+            if p > 0:
+                rv.append(rest[:p])
+                rest = rest[p:]
+
+            c = rest[1:2]
+            if c == "$":
+                rv.append("$")
+                rest = rest[2:]
+            elif c == "{":
+                match = self.reference.match(rest)
+                if match is None:
+                    raise configparser.InterpolationSyntaxError(
+                        option, section, f"bad interpolation variable reference {rest!r}"
+                    )
+                path = match.group(1).split(":")
+                rest = rest[match.end():]
+                if len(path) == 1:
+                    rv.append((None, self.parser.optionxform(path[0])))
+                elif len(path) == 2:
+                    rv.append((path[0], self.parser.optionxform(path[1])))
+                else:
+                    raise configparser.InterpolationSyntaxError(
+                        option, section, f"More than one ':' found: {rest!r}"
+                    )
+            else:
+                raise configparser.InterpolationSyntaxError(
+                    option, section, f"'$' must be followed by '$' or '{{', found: {rest!r}"
+                )
+
+        self.parsed[value] = rv
+        return rv
+
+    def references(self, node, value):
+        section, option = node
+        rv = []
+        for part in self.parse(section, option, value):
+            if isinstance(part, tuple):
+                ref = (part[0] or section, part[1])
+                try:
+                    self.raw(*ref)
+                except (KeyError, configparser.NoSectionError):
+                    reference = ":".join(i for i in part if i is not None)
+                    raise configparser.InterpolationMissingOptionError(option, section, value, reference) from None
+                rv.append(ref)
+        return rv
+
+    def get(self, section, option):
+        "Return the value of an option with all its substitutions made."
+        value = self.raw(section, option)
+        if value is None or "$" not in value:
+            return value
+
+        default = self.parser.default_section
+        if section != default and option not in self.parser._sections[section]:
+            if all(not isinstance(i, tuple) or i[0] for i in self.parse(section, option, value)):
+                section = default
+
+        start = (section, option)
+        try:
+            return self.values[start]
+        except KeyError:
+            pass
+
+        stack = [(start, iter(self.references(start, value)))]
+        walk = {start}
+        while stack:
+            node, refs = stack[-1]
+            for ref in refs:
+                self.users[ref].add(node)
+                self.refers[node].add(ref)
+                if ref in self.values:
+                    continue
+                value = self.raw(*ref)
+                if value is None or "$" not in value:
+                    continue
+                if ref in walk:
+                    path = [i for i, _ in stack]
+                    raise InterpolationCycleError(path[path.index(ref):] + [ref])
+                walk.add(ref)
+                stack.append((ref, iter(self.references(ref, value))))
+                break
+            else:
+                stack.pop()
+                walk.discard(node)
+                self.values[node] = self.join(node)
+        return self.values[start]
+
+    def join(self, node):
+        "Put the values of its references, all resolved already, into the raw value of a node."
+        section, option = node
+        return "".join(
+            part if isinstance(part, str) else self.get(part[0] or section, part[1])
+            for part in self.parse(section, option, self.raw(section, option))
+        )
+
+    def section(self, name):
+        "Return every option of a section, defaults first, with substitutions made."
+        options = self.parser._sections[name]
+        defaults = self.parser._defaults
+        keys = itertools.chain(defaults, (k for k in options if k not in defaults))
+        return {k: self.get(name, k) for k in keys}
+
+    def invalidate(self, section, option=None):
+        "Forget the values of a section, or one option of it, and of all those which refer to them."
+        nodes = set(self.values).union(self.users)
+        if section == self.parser.default_section:
+            stack = [i for i in nodes if option is None or i[1] == option]
+        elif option is None:
+            stack = [i for i in nodes if i[0] == section]
+        else:
+            stack = [(section, option)]
+
+        while stack:
+            node = stack.pop()
+            self.values.pop(node, None)
+            stack.extend(self.users.pop(node, ()))
+            for ref in self.refers.pop(node, ()):
+                users = self.users.get(ref, set())
+                users.discard(node)
+                if not users:
+                    self.users.pop(ref, None)
+
+
 class Conf(configparser.ConfigParser):
 
     @classmethod
@@ -39,10 +244,42 @@ class Conf(configparser.ConfigParser):
     def sections(self):
         return {k: v for k, v in self.items() if k != self.default_section}
 
+    @functools.cached_property
+    def resolver(self):
+        return Resolver(self)
+
+    def set(self, section, option, value=None):
+        super().set(section, option, value)
+        if "resolver" in self.__dict__:
+            self.resolver.invalidate(section, self.optionxform(option))
+
+    def remove_option(self, section, option):
+        option = self.optionxform(option)
+        options = self._defaults if section == self.default_section else self._sections.get(section, {})
+        value = options.get(option)
+        rv = super().remove_option(section, option)
+        if "resolver" in self.__dict__:
+            self.resolver.invalidate(section, option)
+            self.resolver.parsed.pop(value, None)
+        return rv
+
+    def read_file(self, f, source=None):
+        self.__dict__.pop("resolver", None)
+        return super().read_file(f, source)
+
+    def remove_section(self, section):
+        values = list(self._sections.get(section, {}).values())
+        rv = super().remove_section(section)
+        if "resolver" in self.__dict__:
+            self.resolver.invalidate(section)
+            for value in values:
+                self.resolver.parsed.pop(value, None)
+        return rv
+
     @property
     def literals(self):
-        d = self.defaults()
-        return {k: dict(d, **s) for k, s in self.sections.items()}
+        "Map each section to all its options, defaults first, with substitutions made."
+        return {k: self.resolver.section(k) for k in self._sections}
 
     def dumps(self):
         rv = [
@@ -54,6 +291,129 @@ class Conf(configparser.ConfigParser):
         ]
         return "\n".join(j for i in rv for j in i)
 
+    def dump_section(self, name):
+        return "\n".join(
+            itertools.chain(
+                (f"[{name}]",),
+                (f"{k} = {v}" for k, v in self.resolver.section(name).items())
+            )
+        )
+
+
+def chunks(lines):
+    """
+    Split lines into the text of each section, as configparser would read them.
+    A header indented under an option is a continuation of its value, not a header.
+
+    """
+    header = re.compile(r"\[\s*\S+\s*\]")
+    rv = []
+    indent = None
+    for line in lines:
+        stripped = line.strip()
+        if stripped and stripped[0] not in "#;":
+            level = len(line) - len(line.lstrip())
+            if indent is not None and level > indent:
+                pass
+            elif header.match(stripped):
+                if rv:
+                    yield "".join(rv)
+                rv = []
+                indent = None
+            else:
+                indent = level
+        rv.append(line if line.endswith("\n") else line + "\n")
+    if rv:
+        yield "".join(rv)
+
+
+def references(lines):
+    "Collect (section, option) for every substitution in lines; section is None for those in the same section."
+    reference = Resolver.reference
+    rv = set()
+    for line in lines:
+        if "${" in line:
+            for path in reference.findall(line):
+                section, _, option = path.rpartition(":")
+                rv.add((section or None, option))
+    return rv
+
+
+def stream(lines, index=None):
+    """
+    Generate the literal text of each section in order, as soon as it and all
+    before it can be resolved. A section which refers forward waits, along
+    with those after it, until the section it refers to has been read.
+
+    Once written, a section keeps only those options named in `index`, as
+    made by `references`, and is itself kept while the index names it, so
+    that its defaults may still be referred to. Without an index, every
+    option is kept.
+    DEFAULT must come before any other section.
+
+    """
+    conf = Conf()
+    scratch = Conf()
+    named = {section for section, option in index or ()}
+    seen = set()
+    pending = deque()
+    waiting = None
+    for text in chunks(lines):
+        scratch.read_string(text)
+        if scratch._defaults:
+            if seen:
+                raise configparser.Error("DEFAULT must precede other sections to stream them.")
+            conf.read_dict({conf.default_section: scratch._defaults})
+            scratch._defaults.clear()
+        for name, options in list(scratch._sections.items()):
+            scratch.remove_section(name)
+            if name in seen:
+                raise configparser.DuplicateSectionError(name)
+            seen.add(name)
+            conf.read_dict({name: options})
+            pending.append(name)
+
+        if waiting is None or waiting in seen:
+            waiting = yield from flush(conf, pending, seen, index, named)
+
+    yield from flush(conf, pending, seen, index, named, final=True)
+
+
+def flush(conf, pending, seen, index, named=(), final=False):
+    "Emit pending sections in order. Return the name of a section still to be read, if one is needed."
+    while pending:
+        name = pending[0]
+        try:
+            text = conf.dump_section(name)
+        except configparser.InterpolationMissingOptionError as e:
+            section, _, option = e.reference.rpartition(":")
+            if final or not section or section in seen:
+                raise
+            return section
+        yield text
+
+        pending.popleft()
+        if index is None:
+            continue
+        options = conf._sections[name]
+        for option in [k for k in options if (name, k) not in index and (None, k) not in index]:
+            conf.remove_option(name, option)
+        if not options and name not in named:
+            conf.remove_section(name)
+    return None
+
+
+def interpolate(source, target, cache=None):
+    "Apply substitutions to one file of a batch."
+    text = source.read_text()
+    rv = cache and cache.get(text)
+    if not isinstance(rv, str):
+        rv = Conf.loads(text).dumps()
+        if cache:
+            cache.put(text, rv)
+    target.write_text(rv + "\n")
+    return len(rv)
+
 
 class TestConf(unittest.TestCase):
 
@@ -143,6 +503,7 @@ class TestConf(unittest.TestCase):
         flavour = ${A:flavour}
         """
         conf = Conf.loads(text)
+        self.assertEqual({"A": {"flavour": "strawberry"}, "B": {"flavour": "strawberry"}}, conf.literals)
 
     def test_dumps_simple(self):
         text = """
@@ -178,30 +539,325 @@ class TestConf(unittest.TestCase):
         self.assertEqual(8, rv.count('"'))
 
 
+class TestResolver(unittest.TestCase):
+
+    text = """
+    [DEFAULT]
+    name = default
+    title = ${name} $$1
+    [A]
+    name = a
+    flavour = strawberry
+    [B]
+    flavour = ${A:flavour} and ${A:title}
+    [C]
+    flavour = ${B:flavour}, ${DEFAULT:title}
+    """
+
+    def test_equivalent(self):
+        conf = Conf.loads(self.text)
+        for name, section in conf.literals.items():
+            for k, v in section.items():
+                with self.subTest(section=name, option=k):
+                    self.assertEqual(conf.get(name, k), v)
+        self.assertEqual("strawberry and a $1, default $1", conf.literals["C"]["flavour"])
+        self.assertEqual(["name", "title", "flavour"], list(conf.literals["A"]))
+
+    def test_once(self):
+        conf = Conf.loads(self.text)
+        conf.literals
+        parsed = dict(conf.resolver.parsed)
+        values = dict(conf.resolver.values)
+        conf.literals
+        self.assertEqual(parsed, conf.resolver.parsed)
+        self.assertEqual(values, conf.resolver.values)
+        self.assertEqual("default $1", values[("C", "title")])
+
+    def test_depth(self):
+        text = "[A]\nx0 = 0\n" + "\n".join(f"x{n + 1} = ${{x{n}}}" for n in range(32))
+        conf = Conf.loads(text)
+        self.assertRaises(configparser.InterpolationDepthError, conf.get, "A", "x32")
+        self.assertEqual("0", conf.literals["A"]["x32"])
+
+    def test_cycle(self):
+        text = """
+        [A]
+        x = ${B:y}
+        [B]
+        y = ${z}
+        z = ${A:x}
+        [C]
+        """
+        conf = Conf.loads(text)
+        with self.assertRaises(InterpolationCycleError) as context:
+            conf.literals
+        self.assertEqual([("A", "x"), ("B", "y"), ("B", "z"), ("A", "x")], context.exception.path)
+        self.assertIn("${A:x} -> ${B:y} -> ${B:z} -> ${A:x}", str(context.exception))
+
+    def test_missing(self):
+        conf = Conf.loads("[A]\nx = ${B:y}\n[B]\n")
+        self.assertRaises(configparser.InterpolationMissingOptionError, getattr, conf, "literals")
+        conf = Conf.loads("[A]\nx = $y\n")
+        self.assertRaises(configparser.InterpolationSyntaxError, getattr, conf, "literals")
+
+    def test_defaults_shared(self):
+        text = self.text.replace("[DEFAULT]\n", "[DEFAULT]\n    banner = ${A:flavour} $$2\n")
+        conf = Conf.loads(text)
+        literals = conf.literals
+        self.assertEqual("strawberry $2", literals["C"]["banner"])
+        self.assertIs(literals["B"]["banner"], literals["C"]["banner"])
+        self.assertIn(("DEFAULT", "banner"), conf.resolver.values)
+        self.assertNotIn(("B", "banner"), conf.resolver.values)
+        self.assertIn(("B", "title"), conf.resolver.values)
+
+        conf["A"]["flavour"] = "vanilla"
+        self.assertEqual("vanilla $2", conf.literals["B"]["banner"])
+        conf["B"]["banner"] = "${title}"
+        self.assertEqual("default $1", conf.literals["B"]["banner"])
+        self.assertEqual("vanilla $2", conf.literals["C"]["banner"])
+
+    def test_incremental(self):
+        conf = Conf.loads(self.text)
+        conf.literals
+        conf["A"]["flavour"] = "vanilla"
+        self.assertNotIn(("B", "flavour"), conf.resolver.values)
+        self.assertNotIn(("C", "flavour"), conf.resolver.values)
+        self.assertIn(("C", "title"), conf.resolver.values)
+        self.assertEqual("vanilla and a $1, default $1", conf.literals["C"]["flavour"])
+
+        conf.set("DEFAULT", "name", "other")
+        self.assertEqual("vanilla and a $1, other $1", conf.literals["C"]["flavour"])
+        self.assertEqual("other $1", conf.literals["B"]["title"])
+
+
+class TestStream(unittest.TestCase):
+
+    text = textwrap.dedent("""
+    [DEFAULT]
+    unit = m
+
+    [A]
+    size = 3 ${unit}
+    note = a header inside a value
+        [B]
+
+    [B]
+    # refers forward
+    label = ${C:label} too
+    scratch = unused
+
+    [C]
+    label = see ${A:size}
+
+    [D]
+    label = plain
+    """)
+
+    def test_equivalent(self):
+        expected = Conf.loads(self.text).dumps()
+        for index in (None, references(io.StringIO(self.text))):
+            with self.subTest(index=index):
+                rv = "\n".join(stream(io.StringIO(self.text), index))
+                self.assertEqual(expected, rv)
+
+    def test_early(self):
+        lines = iter(io.StringIO(self.text))
+        rv = stream(lines)
+        self.assertEqual("[A]", next(rv).splitlines()[0])
+        self.assertIn("[C]\n", list(lines))
+
+    def test_waiting(self):
+        lines = iter(io.StringIO(self.text))
+        rv = stream(lines)
+        self.assertEqual(["[A]", "[B]", "[C]"], [next(rv).splitlines()[0] for i in range(3)])
+        self.assertEqual(["label = plain\n"], list(lines))
+
+    def test_index(self):
+        index = references(io.StringIO(self.text))
+        self.assertEqual({(None, "unit"), ("C", "label"), ("A", "size")}, index)
+        self.assertEqual(4, len(list(stream(io.StringIO(self.text), index))))
+
+    def test_emptied(self):
+        text = "[DEFAULT]\nunit = m\n[A]\nx = 1\n[B]\ny = ${A:unit}\n"
+        index = references(io.StringIO(text))
+        self.assertEqual(Conf.loads(text).dumps(), "\n".join(stream(io.StringIO(text), index)))
+
+    def test_bounded(self):
+        held = []
+        state = {}
+        text = self.text + "".join(f"[E{i}]\nlabel = ${{A:size}} {i}\n" for i in range(50))
+
+        def lines():
+            for line in io.StringIO(text):
+                yield line
+                if line.startswith("[D]"):
+                    conf = rv.gi_frame.f_locals["conf"]
+                    held.extend((k, o) for k, v in conf._sections.items() for o in v)
+            state.update(rv.gi_frame.f_locals)
+
+        rv = stream(lines(), references(io.StringIO(text)))
+        list(rv)
+        self.assertEqual([("A", "size"), ("C", "label")], held)
+
+        conf, scratch = state["conf"], state["scratch"]
+        self.assertEqual(["A", "C"], list(conf._sections))
+        self.assertEqual([scratch.default_section], list(scratch._proxies))
+        self.assertLessEqual(len(conf.resolver.parsed), 2)
+        self.assertLessEqual(len(conf.resolver.users), 2)
+        self.assertLessEqual(len(conf.resolver.refers), 2)
+
+    def test_errors(self):
+        self.assertRaises(
+            configparser.Error, list, stream(io.StringIO("[A]\n[DEFAULT]\nx = 1\n"))
+        )
+        self.assertRaises(
+            configparser.DuplicateSectionError, list, stream(io.StringIO("[A]\n[B]\n[A]\n"))
+        )
+        self.assertRaises(
+            configparser.InterpolationMissingOptionError, list, stream(io.StringIO("[A]\nx = ${B:y}\n"))
+        )
+        self.assertRaises(
+            configparser.InterpolationMissingOptionError, list, stream(io.StringIO("[A]\n[B]\nx = ${A:y}\n"))
+        )
+        self.assertRaises(configparser.MissingSectionHeaderError, list, stream(io.StringIO("x = 1\n")))
+
+
+class TestBatch(unittest.TestCase):
+
+    def test_batch(self):
+        with tempfile.TemporaryDirectory() as parent:
+            parent = pathlib.Path(parent)
+            parent.joinpath("good.toml").write_text("[A]\nflavour = 1\n[B]\nflavour = ${A:flavour}\n")
+            parent.joinpath("bad.toml").write_text("[A]\nflavour = ${Z:flavour}\n")
+            output = parent.joinpath("output")
+            args = parser().parse_args(["--no-cache", "--jobs", "1", "--output", str(output), str(parent)])
+            with contextlib.redirect_stderr(io.StringIO()) as stream:
+                self.assertEqual(1, main(args))
+            self.assertIn("1 written, 0 up to date, 1 failed", stream.getvalue())
+            self.assertEqual("[A]\nflavour = 1\n[B]\nflavour = 1\n", output.joinpath("good.toml").read_text())
+            self.assertEqual(["good.toml"], [i.name for i in output.iterdir()])
+
+    def test_batch_output(self):
+        args = parser().parse_args(["--no-cache", "."])
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(2, main(args))
+
+
 def main(args):
     if args.test:
         suite = unittest.defaultTestLoader.loadTestsFromName("__main__")
         unittest.TextTestRunner().run(suite)
         return 0
+
+    if args.no_cache:
+        cache = None
     else:
+        version = Cache.digest(__name__, pathlib.Path(__file__).read_bytes())
+        cache = Cache(args.cache, version=version)
+
+    if is_batch(args.input):
+        if not args.output:
+            print("A batch of files needs an --output directory.", file=sys.stderr)
+            return 2
+        args.output.mkdir(parents=True, exist_ok=True)
+        outcomes = batch(
+            expand(args.input), interpolate, lambda x: args.output.joinpath(x.name),
+            cache, jobs=args.jobs, force=args.force
+        )
+        return 1 if summary(outcomes, sys.stderr) else 0
+
+    if args.stream:
+        output = args.output.open("w") if args.output else sys.stdout
+        try:
+            if args.input:
+                with args.input.open() as lines:
+                    index = references(lines)
+                with args.input.open() as lines:
+                    for text in stream(lines, index):
+                        print(text, file=output)
+            else:
+                for text in stream(sys.stdin):
+                    print(text, file=output)
+        finally:
+            if args.output:
+                output.close()
+        return 0
+
+    profiler = Profiler(enabled=bool(args.profile))
+    with profiler.phase("read"):
         if not args.input:
             text = sys.stdin.read()
         else:
             text = args.input.read_text()
 
-    conf = Conf.loads(text)
-    print(conf.dumps(), file=sys.stdout)
+    with profiler.phase("cache"):
+        rv = cache and cache.get(text)
+
+    if not isinstance(rv, str):
+        with profiler.phase("parse"):
+            conf = Conf.loads(text)
+        with profiler.phase("interpolate"):
+            rv = conf.dumps()
+        if cache:
+            with profiler.phase("cache"):
+                cache.put(text, rv)
+
+    with profiler.phase("emit"):
+        if args.output:
+            args.output.write_text(rv + "\n")
+        else:
+            print(rv, file=sys.stdout)
+
+    if args.profile:
+        if cache:
+            profiler.count(**{"cache.hits": cache.hits, "cache.misses": cache.misses})
+        profiler.count(bytes=len(rv))
+        profiler.report(sys.stderr, format=args.profile)
+        profiler.stop()
+    return 0
 
 
 def parser():
     rv = argparse.ArgumentParser(__doc__)
+    rv.add_argument(
+        "--profile", default=None, action="store_const", const="text",
+        help="Report the time and memory of each phase to stderr."
+    )
+    rv.add_argument(
+        "--profile-json", dest="profile", action="store_const", const="json",
+        help="Report the time and memory of each phase to stderr as JSON."
+    )
+    rv.add_argument(
+        "--cache", default=None, type=pathlib.Path,
+        help=f"Set cache directory [{Cache.default_path()}]."
+    )
+    rv.add_argument(
+        "--no-cache", default=False, action="store_true",
+        help="Interpolate the input without consulting the cache."
+    )
+    rv.add_argument(
+        "--jobs", default=None, type=int,
+        help="Set the number of processes which interpolate files."
+    )
+    rv.add_argument(
+        "--force", default=False, action="store_true",
+        help="Interpolate every file of a batch, even those whose output is newer."
+    )
+    rv.add_argument(
+        "--output", default=None, type=pathlib.Path,
+        help="Set output file, or directory for a batch."
+    )
+    rv.add_argument(
+        "--stream", default=False, action="store_true",
+        help="Write each section as soon as it can be resolved. Does not use the cache."
+    )
     rv.add_argument(
         "--test", default=False, action="store_true",
         help="Run unit tests."
     )
     rv.add_argument(
         "input", nargs="?", type=pathlib.Path,
-        help="Set input file."
+        help="Set input file, or a directory or glob of them."
     )
     return rv
 
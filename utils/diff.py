@@ -0,0 +1,222 @@
+#! /usr/bin/env python
+# encoding: utf-8
+
+from collections import Counter
+from collections import namedtuple
+import hashlib
+import itertools
+import textwrap
+import unittest
+
+from utils.toml2dot import attributes
+from utils.toml2dot import identifier
+from utils.toml2dot import Model
+
+
+"""
+This module compares two versions of a Model, and draws only what changed.
+
+Nodes are matched by name, and arcs by their Node, label and target. A
+digest of each Node and of each subtree is made bottom up, so a subtree
+which is the same in both versions is passed over without looking inside
+it. Changed Nodes and arcs are drawn together with the parents and ends
+which give them context.
+
+"""
+
+
+Delta = namedtuple("Delta", ["nodes", "arcs"])
+
+COLOURS = {
+    "added": "#00a000",
+    "removed": "#c00000",
+    "modified": "#e08000",
+    "context": "#a0a0a0",
+}
+
+
+def paint(status, style=None):
+    colour = COLOURS[status]
+    return f'color="{colour}" fontcolor="{colour}"' + (f', style="{style}"' if style else "")
+
+
+def content(node):
+    "Return the drawn attributes of a Node, and those of its arcs by their key."
+    return (
+        (node.label, node.weight, node.color, node.fill, node.stroke),
+        {(a.node, a.label, a.target): (a.weight, a.color, a.fill, a.stroke) for a in node.arcs}
+    )
+
+
+def digests(model):
+    "Return a digest of each Node, and of the subtree below each Node, by name."
+    own = {}
+    tree = {}
+    stack = [(name, False) for name in model.hierarchy[None]]
+    while stack:
+        name, done = stack.pop()
+        children = model.hierarchy[name]
+        if not done:
+            stack.append((name, True))
+            stack.extend((i, False) for i in children)
+            continue
+
+        attrs, arcs = content(model.nodes[name])
+        own[name] = hashlib.blake2b(repr((attrs, sorted(arcs.items()))).encode("utf-8"), digest_size=16).digest()
+        rv = hashlib.blake2b(own[name], digest_size=16)
+        for child in sorted(children):
+            rv.update(child.encode("utf-8"))
+            rv.update(tree[child])
+        tree[name] = rv.digest()
+    return own, tree
+
+
+def diff(old, new):
+    """
+    Compare two Models, returning a Delta of the status of each changed Node by name,
+    and of each changed arc by its Node, label and target.
+
+    """
+    old_own, old_tree = digests(old)
+    new_own, new_tree = digests(new)
+    nodes = {}
+    arcs = {}
+    seen = set()
+    stack = list(dict.fromkeys(itertools.chain(old.hierarchy[None], new.hierarchy[None])))
+    while stack:
+        name = stack.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+
+        if name in old.nodes and name in new.nodes:
+            if old_tree[name] == new_tree[name]:
+                continue
+            children = itertools.chain(old.hierarchy[name], new.hierarchy[name])
+            if old_own[name] != new_own[name]:
+                old_attrs, old_arcs = content(old.nodes[name])
+                new_attrs, new_arcs = content(new.nodes[name])
+                if old_attrs != new_attrs:
+                    nodes[name] = "modified"
+                for key in old_arcs.keys() | new_arcs.keys():
+                    if key not in new_arcs:
+                        arcs[key] = "removed"
+                    elif key not in old_arcs:
+                        arcs[key] = "added"
+                    elif old_arcs[key] != new_arcs[key]:
+                        arcs[key] = "modified"
+        else:
+            status, model = ("added", new) if name in new.nodes else ("removed", old)
+            nodes[name] = status
+            arcs.update({key: status for key in content(model.nodes[name])[1]})
+            children = model.hierarchy[name]
+        stack.extend(i for i in children if i not in seen)
+    return Delta(nodes, arcs)
+
+
+def to_dot(old, new, delta, label="diff", directed=True):
+    "Draw the changed Nodes and arcs of a Delta, with the parents and ends which give them context."
+    arc_style = "->" if directed else "--"
+    drawn = dict(delta.nodes)
+    edges = []
+    for name, status in delta.nodes.items():
+        model = old if status == "removed" else new
+        parent = model.nodes[name].parent
+        if parent is not None:
+            drawn.setdefault(parent, "context")
+            edges.append((parent, name, "...", status))
+
+    for (node, text, target), status in delta.arcs.items():
+        drawn.setdefault(node, "context")
+        drawn.setdefault(target, "context")
+        edges.append((node, target, text, status))
+
+    counts = Counter(itertools.chain(delta.nodes.values(), delta.arcs.values()))
+    summary = ", ".join(f"{counts[i]} {i}" for i in ("added", "removed", "modified"))
+
+    yield f'{"digraph" if directed else "graph"} "{label}" {{'
+    yield f'label="{label}: {summary}"'
+    yield 'node [ shape=box ]'
+    yield ""
+    for name in dict.fromkeys(itertools.chain(new.nodes, old.nodes)):
+        status = drawn.get(name)
+        if status is None:
+            continue
+        node = (old if status == "removed" else new).nodes[name]
+        style = "dashed" if status in ("removed", "context") else None
+        yield f"{identifier(name)}{attributes(node.label, paint(status, style))}"
+
+    yield ""
+    for source, target, text, status in edges:
+        if source not in drawn or target not in drawn:
+            continue
+        style = "dotted" if text == "..." else "dashed" if status == "removed" else None
+        yield f"{identifier(source)} {arc_style} {identifier(target)}{attributes(text, paint(status, style))}"
+    yield ""
+    yield "}"
+
+
+class TestDiff(unittest.TestCase):
+
+    old = textwrap.dedent("""
+    [A]
+    [A.B]
+    [A.B.x]
+    target = "C"
+    [A.C]
+    [D]
+    label = "Dee"
+    [D.E]
+    [D.E.y]
+    target = "A"
+    [F]
+    [F.G]
+    """)
+
+    def test_same(self):
+        model = Model.loads(self.old)
+        self.assertEqual(Delta({}, {}), diff(model, Model.loads(self.old)))
+
+    def test_nodes(self):
+        new = self.old.replace('label = "Dee"', 'label = "Delta"').replace("[F]\n[F.G]\n", "[H]\n[H.I]\n")
+        rv = diff(Model.loads(self.old), Model.loads(new))
+        self.assertEqual(
+            {"D": "modified", "F": "removed", "F.G": "removed", "H": "added", "H.I": "added"},
+            rv.nodes
+        )
+        self.assertEqual({}, rv.arcs)
+
+    def test_arcs(self):
+        new = self.old.replace('target = "C"', 'target = "D"').replace('target = "A"', 'target = "A"\nweight = 3.0')
+        rv = diff(Model.loads(self.old), Model.loads(new))
+        self.assertEqual({}, rv.nodes)
+        self.assertEqual(
+            {("A.B", "x", "A.C"): "removed", ("A.B", "x", "D"): "added", ("D.E", "y", "A"): "modified"},
+            rv.arcs
+        )
+
+    def test_moved(self):
+        "A Node whose parent goes keeps its name, and is compared where it now is."
+        old = Model.loads(self.old)
+        new = Model.loads(self.old.replace("[A.B]\n", ""))
+        rv = diff(old, new)
+        self.assertEqual({"A.B": "removed"}, rv.nodes)
+
+    def test_subtrees_skipped(self):
+        old = Model.loads(self.old)
+        new = Model.loads(self.old.replace('label = "Dee"', 'label = "Delta"'))
+        own, tree = digests(old)
+        self.assertEqual(own, digests(Model.loads(self.old))[0])
+        self.assertNotEqual(tree["D"], digests(new)[1]["D"])
+        self.assertEqual(tree["A"], digests(new)[1]["A"])
+
+    def test_to_dot(self):
+        old = Model.loads(self.old)
+        new = Model.loads(self.old.replace('target = "C"', 'target = "D"') + "[D.J]\n")
+        delta = diff(old, new)
+        rv = "\n".join(to_dot(old, new, delta, label="test"))
+        self.assertIn('label="test: 2 added, 1 removed, 0 modified"', rv)
+        self.assertIn(f'{identifier("D.J")} [ label="D.J", color="{COLOURS["added"]}"', rv)
+        self.assertIn(f'{identifier("D")} [ label="Dee", color="{COLOURS["context"]}"', rv)
+        self.assertIn(f'{identifier("A.B")} -> {identifier("A.C")} [ label="x", color="{COLOURS["removed"]}"', rv)
+        self.assertNotIn(identifier("F.G"), rv)
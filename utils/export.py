@@ -0,0 +1,394 @@
+#! /usr/bin/env python
+# encoding: utf-8
+
+import array
+import bisect
+from collections import namedtuple
+import io
+import mmap
+import pathlib
+import struct
+import sys
+import tempfile
+import unittest
+
+
+"""
+This module exports a Model as flat arrays, for tools which want the graph without parsing DOT or TOML.
+
+Nodes are numbered in document order. Every string is stored once, and
+every combination of weight and colours once. The hierarchy and the arcs
+are each kept as an offset array into a flat array of indices, so the
+children or arcs of a Node are a slice.
+
+The binary format is a header, a directory of sections, and the sections
+themselves, each aligned to 8 bytes and little-endian. A Graph maps the
+file into memory and answers queries from it directly, without building
+any Nodes. The JSON format holds the same arrays as lists.
+
+"""
+
+
+MAGIC = b"UNCG"
+VERSION = 1
+HEADER = struct.Struct("<4sI")
+ENTRY = struct.Struct("<QQ")
+
+SECTIONS = (
+    ("offsets", "I"),       # K + 1 byte offsets into text, one string per index
+    ("text", "B"),          # UTF-8 of every string
+    ("names", "I"),         # N string index of each Node name
+    ("labels", "I"),        # N string index of each Node label
+    ("parents", "i"),       # N index of each parent Node, or -1 for a root
+    ("node_styles", "I"),   # N style index of each Node
+    ("order", "I"),         # N Node indices sorted by name
+    ("child_start", "I"),   # N + 2 offsets into children; row N holds the roots
+    ("children", "I"),      # N indices of child Nodes
+    ("arc_start", "I"),     # N + 1 offsets into the arc arrays by source Node
+    ("arc_targets", "I"),   # M index of the Node each arc enters
+    ("arc_labels", "I"),    # M string index of each arc label
+    ("arc_styles", "I"),    # M style index of each arc
+    ("in_start", "I"),      # N + 1 offsets into in_arcs by target Node
+    ("in_arcs", "I"),       # M arc indices grouped by the Node they enter
+    ("arc_sources", "I"),   # M index of the Node each arc leaves
+    ("weights", "d"),       # S weight of each style
+    ("colours", "B"),       # S * 12 RGBA of the color, fill and stroke of each style
+)
+
+Style = namedtuple("Style", ["weight", "color", "fill", "stroke"])
+
+
+def csr(rows, count):
+    "Flatten lists of indices into an array of offsets and an array of values."
+    start = array.array("I", [0])
+    values = array.array("I")
+    for n in range(count):
+        values.extend(rows.get(n, ()))
+        start.append(len(values))
+    return start, values
+
+
+def arrays(model):
+    "Return the arrays of a Model by section name, and its strings in index order."
+    names = list(model.nodes)
+    index = {k: n for n, k in enumerate(names)}
+    strings = {}
+    styles = {}
+
+    def intern(text):
+        return strings.setdefault(str(text), len(strings))
+
+    def styled(item):
+        return styles.setdefault((float(item.weight), item.color, item.fill, item.stroke), len(styles))
+
+    rv = {name: array.array(code) for name, code in SECTIONS}
+    children = {}
+    arcs = []
+    for n, (name, node) in enumerate(model.nodes.items()):
+        rv["names"].append(intern(name))
+        rv["labels"].append(intern(node.label))
+        rv["node_styles"].append(styled(node))
+        parent = index[node.parent] if node.parent is not None else -1
+        rv["parents"].append(parent)
+        children.setdefault(parent if parent >= 0 else len(names), []).append(n)
+        arcs.extend((n, index[a.target], a) for a in node.arcs if a.target in index)
+
+    rv["order"].extend(sorted(range(len(names)), key=names.__getitem__))
+    rv["child_start"], rv["children"] = csr(children, len(names) + 1)
+
+    sources = {}
+    entering = {}
+    for m, (source, target, arc) in enumerate(arcs):
+        sources.setdefault(source, []).append(m)
+        entering.setdefault(target, []).append(m)
+        rv["arc_sources"].append(source)
+        rv["arc_targets"].append(target)
+        rv["arc_labels"].append(intern(arc.label))
+        rv["arc_styles"].append(styled(arc))
+    rv["arc_start"] = csr(sources, len(names))[0]
+    rv["in_start"], rv["in_arcs"] = csr(entering, len(names))
+
+    for weight, *colours in styles:
+        rv["weights"].append(weight)
+        rv["colours"].extend(i for rgba in colours for i in rgba)
+
+    text = bytearray()
+    rv["offsets"].append(0)
+    for string in strings:
+        text.extend(string.encode("utf-8"))
+        rv["offsets"].append(len(text))
+    rv["text"].frombytes(text)
+    return rv, list(strings)
+
+
+def to_binary(model, stream):
+    "Write a Model to a binary stream in the fixed layout of SECTIONS."
+    sections, strings = arrays(model)
+    blobs = []
+    for name, code in SECTIONS:
+        data = sections[name]
+        if sys.byteorder == "big":
+            data = array.array(code, data)
+            data.byteswap()
+        blobs.append((data.tobytes(), len(data)))
+
+    offset = HEADER.size + ENTRY.size * len(SECTIONS)
+    directory = []
+    for blob, count in blobs:
+        offset += -offset % 8
+        directory.append(ENTRY.pack(offset, count))
+        offset += len(blob)
+
+    stream.write(HEADER.pack(MAGIC, VERSION))
+    stream.writelines(directory)
+    pos = HEADER.size + ENTRY.size * len(SECTIONS)
+    for blob, count in blobs:
+        stream.write(bytes(-pos % 8))
+        pos += -pos % 8
+        stream.write(blob)
+        pos += len(blob)
+
+
+def to_json(model, stream):
+    "Write a Model to a text stream as JSON, with the same arrays as the binary format."
+    import json
+    sections, strings = arrays(model)
+    data = dict(format="uncarved.graph", version=VERSION, strings=strings)
+    data.update({name: sections[name].tolist() for name, code in SECTIONS if name not in ("offsets", "text")})
+    json.dump(data, stream, separators=(",", ":"))
+
+
+FORMATS = {"graph": to_binary, "json": to_json}
+
+
+def dump(model, stream, format="graph"):
+    "Write a Model to stream in the named format. A graph needs a binary stream."
+    FORMATS[format](model, stream)
+
+
+class Strings:
+    "Decode strings from the text section on demand."
+
+    def __init__(self, offsets, text):
+        self.offsets = offsets
+        self.text = text
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, n):
+        return bytes(self.text[self.offsets[n]:self.offsets[n + 1]]).decode("utf-8")
+
+
+class Graph:
+    """
+    Answer queries on an exported Model from its arrays.
+    Nodes are referred to by index; `find` gives the index of a name.
+
+    """
+
+    @classmethod
+    def open(cls, path):
+        "Map a binary file into memory. The Graph must be closed to release it."
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(buffer)
+        magic, version = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            view.release()
+            buffer.close()
+            raise ValueError(f"Not a graph of version {VERSION}: {path}")
+
+        sections = {}
+        for n, (name, code) in enumerate(SECTIONS):
+            offset, count = ENTRY.unpack_from(view, HEADER.size + ENTRY.size * n)
+            size = array.array(code).itemsize
+            data = view[offset:offset + count * size].cast(code)
+            if sys.byteorder == "big" and size > 1:
+                data = array.array(code, data)
+                data.byteswap()
+            sections[name] = data
+        return cls(sections, Strings(sections["offsets"], sections["text"]), buffer=(view, buffer))
+
+    @classmethod
+    def from_json(cls, stream):
+        import json
+        data = json.load(stream)
+        if data.get("format") != "uncarved.graph" or data.get("version") != VERSION:
+            raise ValueError(f"Not a graph of version {VERSION}")
+        return cls(data, data["strings"])
+
+    def __init__(self, sections, strings, buffer=None):
+        self.sections = sections
+        self.strings = strings
+        self.buffer = buffer
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def __len__(self):
+        return len(self.sections["names"])
+
+    def close(self):
+        if self.buffer is None:
+            return
+        for data in self.sections.values():
+            if isinstance(data, memoryview):
+                data.release()
+        view, buffer = self.buffer
+        view.release()
+        buffer.close()
+        self.buffer = None
+
+    def name(self, n):
+        return self.strings[self.sections["names"][n]]
+
+    def label(self, n):
+        return self.strings[self.sections["labels"][n]]
+
+    def find(self, name):
+        "Return the index of the named Node by binary search. Raise KeyError if there is none."
+        order = self.sections["order"]
+        pos = bisect.bisect_left(order, name, key=self.name)
+        if pos == len(order) or self.name(order[pos]) != name:
+            raise KeyError(name)
+        return order[pos]
+
+    def parent(self, n):
+        rv = self.sections["parents"][n]
+        return None if rv < 0 else rv
+
+    def children(self, n=None):
+        "Return the indices of the children of a Node, or of the roots when n is None."
+        start = self.sections["child_start"]
+        row = len(self) if n is None else n
+        return list(self.sections["children"][start[row]:start[row + 1]])
+
+    def targets(self, n):
+        start = self.sections["arc_start"]
+        return list(self.sections["arc_targets"][start[n]:start[n + 1]])
+
+    def sources(self, n):
+        start = self.sections["in_start"]
+        sources = self.sections["arc_sources"]
+        return [sources[m] for m in self.sections["in_arcs"][start[n]:start[n + 1]]]
+
+    def neighbours(self, n):
+        "Return the Nodes joined to a Node by an arc in either direction, once each."
+        return list(dict.fromkeys(self.targets(n) + self.sources(n)))
+
+    def arcs(self, n):
+        "Return the label, target and style index of each arc leaving a Node."
+        start = self.sections["arc_start"]
+        return [
+            (self.strings[self.sections["arc_labels"][m]], self.sections["arc_targets"][m],
+             self.sections["arc_styles"][m])
+            for m in range(start[n], start[n + 1])
+        ]
+
+    def style(self, s):
+        colours = self.sections["colours"][s * 12:s * 12 + 12]
+        return Style(self.sections["weights"][s], *(tuple(colours[i:i + 4]) for i in range(0, 12, 4)))
+
+
+def load(path):
+    "Open a file of either format."
+    path = pathlib.Path(path)
+    with open(path, "rb") as f:
+        magic = f.read(len(MAGIC))
+    if magic == MAGIC:
+        return Graph.open(path)
+    with open(path) as stream:
+        return Graph.from_json(stream)
+
+
+class TestExport(unittest.TestCase):
+
+    text = """
+    [A]
+    label = "Ä"
+    [A.B]
+    [A.B.C]
+    [A.B.C.x]
+    target = "D.E"
+    weight = 2.0
+    [A.B.C.y]
+    target = "A"
+    [D]
+    [D.E]
+    [D.E.z]
+    target = "A.B.C"
+    """
+
+    def setUp(self):
+        from utils.toml2dot import Model
+        self.model = Model.loads(self.text)
+        self.temp = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.temp.name)
+
+    def tearDown(self):
+        self.temp.cleanup()
+
+    def graphs(self):
+        path = self.path.joinpath("model.graph")
+        with open(path, "wb") as stream:
+            to_binary(self.model, stream)
+        with Graph.open(path) as graph:
+            yield graph
+
+        path = self.path.joinpath("model.json")
+        with open(path, "w") as stream:
+            to_json(self.model, stream)
+        yield load(path)
+
+    def test_nodes(self):
+        for graph in self.graphs():
+            with self.subTest(graph=type(graph.strings)):
+                self.assertEqual(list(self.model.nodes), [graph.name(n) for n in range(len(graph))])
+                self.assertEqual("Ä", graph.label(graph.find("A")))
+                self.assertEqual(graph.find("A.B"), graph.parent(graph.find("A.B.C")))
+                self.assertIsNone(graph.parent(graph.find("D")))
+                self.assertRaises(KeyError, graph.find, "A.C")
+
+    def test_hierarchy(self):
+        for graph in self.graphs():
+            with self.subTest(graph=type(graph.strings)):
+                for name, children in self.model.hierarchy.items():
+                    n = None if name is None else graph.find(name)
+                    self.assertEqual(children, [graph.name(i) for i in graph.children(n)])
+
+    def test_arcs(self):
+        for graph in self.graphs():
+            with self.subTest(graph=type(graph.strings)):
+                for name in self.model.nodes:
+                    n = graph.find(name)
+                    self.assertEqual(self.model.forward.get(name, []), [graph.name(i) for i in graph.targets(n)])
+                    self.assertEqual(self.model.reverse.get(name, []), [graph.name(i) for i in graph.sources(n)])
+                c = graph.find("A.B.C")
+                self.assertEqual({"D.E", "A"}, {graph.name(i) for i in graph.neighbours(c)})
+                label, target, s = graph.arcs(c)[0]
+                self.assertEqual(("x", "D.E"), (label, graph.name(target)))
+                self.assertEqual(Style(2.0, (0, 0, 0, 255), (0, 0, 0, 255), (0, 0, 0, 255)), graph.style(s))
+
+    def test_dump(self):
+        stream = io.StringIO()
+        dump(self.model, stream, "json")
+        graph = Graph.from_json(io.StringIO(stream.getvalue()))
+        self.assertEqual(len(self.model.nodes), len(graph))
+
+    def test_format(self):
+        stream = io.BytesIO()
+        to_binary(self.model, stream)
+        data = stream.getvalue()
+        self.assertEqual((MAGIC, VERSION), HEADER.unpack_from(data))
+        for n in range(len(SECTIONS)):
+            offset, count = ENTRY.unpack_from(data, HEADER.size + ENTRY.size * n)
+            self.assertEqual(0, offset % 8)
+
+        path = self.path.joinpath("bad.graph")
+        path.write_bytes(b"UNCG" + bytes(4))
+        self.assertRaises(ValueError, Graph.open, path)
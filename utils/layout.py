@@ -0,0 +1,279 @@
+#! /usr/bin/env python
+# encoding: utf-8
+
+from collections import namedtuple
+import html
+import unittest
+
+
+"""
+This module lays out a Model in layers and writes it as SVG, without Graphviz.
+
+Each Node is placed in the layer of its depth in the hierarchy, and each
+subtree occupies a contiguous span of its layers, so the nesting of the
+taxonomy is kept. Crossings between arcs are reduced by sorting siblings by
+the barycentre of the arcs to and from their subtrees. Every step is linear
+in the number of Nodes and arcs.
+
+"""
+
+
+Box = namedtuple("Box", ["x", "y", "width", "height", "rank"])
+
+
+def measure(label, font=7, pad=16):
+    return len(str(label)) * font + pad
+
+
+def place(order, widths, gap=16, height=32, spacing=80):
+    "Place each subtree centred over the span of its children."
+    extent = {}
+    stack = [(name, False) for name in reversed(order[None])]
+    while stack:
+        name, done = stack.pop()
+        children = order.get(name, [])
+        if done or not children:
+            span = sum(extent[i] for i in children) + gap * (len(children) - 1) if children else 0
+            extent[name] = max(widths[name], span)
+        else:
+            stack.append((name, True))
+            stack.extend((i, False) for i in reversed(children))
+
+    rv = {}
+    left = 0
+    stack = []
+    for root in order[None]:
+        stack.append((root, left, 0))
+        left += extent[root] + gap
+    while stack:
+        name, left, rank = stack.pop()
+        children = order.get(name, [])
+        rv[name] = Box(left + extent[name] / 2, rank * spacing + height / 2, widths[name], height, rank)
+        span = sum(extent[i] for i in children) + gap * (len(children) - 1) if children else 0
+        x = left + (extent[name] - span) / 2
+        for child in children:
+            stack.append((child, x, rank + 1))
+            x += extent[child] + gap
+    return rv
+
+
+def arrange(model, sweeps=4, **kwargs):
+    """
+    Return a Box for each Node of the Model.
+
+    Each sweep goes down through the layers, sorting the subtrees in each layer
+    by the mean position of the Nodes they have arcs with. Sweeps alternate
+    between counting only those Nodes to the left of a subtree and only those to
+    the right, so that neighbouring groups do not swap places in step.
+
+    """
+    order = {k: list(v) for k, v in model.hierarchy.items()}
+    widths = {k: measure(v.label) for k, v in model.nodes.items()}
+    neighbours = {k: [] for k in model.nodes}
+    for name, node in model.nodes.items():
+        for arc in node.arcs:
+            if arc.target in neighbours and arc.target != name:
+                neighbours[name].append(arc.target)
+                neighbours[arc.target].append(name)
+
+    rv = place(order, widths, **kwargs)
+    depth = max((i.rank for i in rv.values()), default=0)
+    for sweep in range(sweeps):
+        for rank in range(depth + 1):
+            members = {}
+            spans = {}
+            stack = [(name, None) for name in order[None]]
+            while stack:
+                name, anchor = stack.pop()
+                box = rv[name]
+                if box.rank == rank:
+                    anchor = name
+                if anchor is not None:
+                    members[name] = anchor
+                    lo, hi = spans.get(anchor, (box.x, box.x))
+                    spans[anchor] = (min(lo, box.x - box.width / 2), max(hi, box.x + box.width / 2))
+                stack.extend((i, anchor) for i in order[name])
+
+            totals = {}
+            for name, anchor in members.items():
+                lo, hi = spans[anchor]
+                for x in (rv[i].x for i in neighbours[name]):
+                    if (x < lo) if sweep % 2 == 0 else (x > hi):
+                        total, count = totals.get(anchor, (0, 0))
+                        totals[anchor] = (total + x, count + 1)
+
+            for children in order.values():
+                if children and rv[children[0]].rank == rank:
+                    children.sort(key=lambda i: totals[i][0] / totals[i][1] if i in totals else rv[i].x)
+            rv = place(order, widths, **kwargs)
+    return rv
+
+
+def paint(rgba):
+    return f"#{rgba.r:02x}{rgba.g:02x}{rgba.b:02x}", f"{rgba.a / 255:.2f}"
+
+
+def to_svg(model, boxes=None, label=None, directed=True, margin=16):
+    boxes = boxes or arrange(model)
+    width = max((b.x + b.width / 2 for b in boxes.values()), default=0) + 2 * margin
+    height = max((b.y + b.height / 2 for b in boxes.values()), default=0) + 2 * margin
+    marker = ' marker-end="url(#arrow)"' if directed else ""
+
+    yield '<?xml version="1.0" encoding="UTF-8"?>'
+    yield (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}"'
+        f' viewBox="{-margin} {-margin} {width:.0f} {height:.0f}" font-family="sans-serif" font-size="12">'
+    )
+    if label:
+        yield f"<title>{html.escape(str(label))}</title>"
+    yield "<defs>"
+    yield (
+        '<marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5"'
+        ' markerWidth="6" markerHeight="6" orient="auto-start-reverse">'
+        '<path d="M 0 0 L 10 5 L 0 10 z"/></marker>'
+    )
+    yield "</defs>"
+
+    yield '<g class="hierarchy" stroke="#999999" stroke-dasharray="4 2">'
+    for name, children in model.hierarchy.items():
+        if name is None:
+            continue
+        parent = boxes[name]
+        for child in (boxes[i] for i in children):
+            yield (
+                f'<line x1="{parent.x:.1f}" y1="{parent.y + parent.height / 2:.1f}"'
+                f' x2="{child.x:.1f}" y2="{child.y - child.height / 2:.1f}"/>'
+            )
+    yield "</g>"
+
+    yield '<g class="arcs" fill="none">'
+    for name, node in model.nodes.items():
+        source = boxes[name]
+        for arc in node.arcs:
+            target = boxes.get(arc.target)
+            if target is None:
+                continue
+            stroke, opacity = paint(arc.stroke)
+            colour, alpha = paint(arc.color)
+            y1, y2 = source.y, target.y
+            if y1 != y2:
+                y1 += source.height / 2 if y2 > y1 else -source.height / 2
+                y2 += target.height / 2 if y1 > y2 else -target.height / 2
+            yield (
+                f'<line x1="{source.x:.1f}" y1="{y1:.1f}" x2="{target.x:.1f}" y2="{y2:.1f}"'
+                f' stroke="{stroke}" stroke-opacity="{opacity}" stroke-width="{arc.weight:.2f}"{marker}/>'
+            )
+            yield (
+                f'<text x="{(source.x + target.x) / 2:.1f}" y="{(y1 + y2) / 2:.1f}"'
+                f' fill="{colour}" fill-opacity="{alpha}" text-anchor="middle">{html.escape(str(arc.label))}</text>'
+            )
+    yield "</g>"
+
+    yield '<g class="nodes" fill="none">'
+    for name, node in model.nodes.items():
+        box = boxes[name]
+        stroke, opacity = paint(node.stroke)
+        colour, alpha = paint(node.color)
+        yield (
+            f'<rect x="{box.x - box.width / 2:.1f}" y="{box.y - box.height / 2:.1f}"'
+            f' width="{box.width:.1f}" height="{box.height:.1f}" rx="4"'
+            f' stroke="{stroke}" stroke-opacity="{opacity}" stroke-width="{node.weight:.2f}"/>'
+        )
+        yield (
+            f'<text x="{box.x:.1f}" y="{box.y + 4:.1f}" fill="{colour}" fill-opacity="{alpha}"'
+            f' text-anchor="middle">{html.escape(str(node.label))}</text>'
+        )
+    yield "</g>"
+    yield "</svg>"
+
+
+class TestLayout(unittest.TestCase):
+
+    def setUp(self):
+        from utils.toml2dot import Model
+        self.Model = Model
+
+    def parse(self, text):
+        import xml.etree.ElementTree as ET
+        return ET.fromstring(text)
+
+    def crossings(self, model, boxes):
+        arcs = [
+            (boxes[n].x, boxes[a.target].x)
+            for n, node in model.nodes.items() for a in node.arcs
+        ]
+        return sum(
+            1 for i, (a, b) in enumerate(arcs) for c, d in arcs[i + 1:]
+            if (a - c) * (b - d) < 0
+        )
+
+    def test_layers(self):
+        text = """
+        [A]
+        [A.B]
+        [A.B.C]
+        [A.D]
+        [E]
+        """
+        model = self.Model.loads(text)
+        boxes = arrange(model)
+        self.assertEqual([0, 1, 2, 1, 0], [boxes[i].rank for i in model.nodes])
+        self.assertLess(boxes["A"].y, boxes["A.B"].y)
+        self.assertLess(boxes["A.B"].y, boxes["A.B.C"].y)
+        self.assertLess(boxes["A.B"].x, boxes["A"].x)
+        self.assertLess(boxes["A"].x, boxes["A.D"].x)
+
+    def test_no_overlap(self):
+        text = "\n".join(f"[N{i}]\n" + "\n".join(f"[N{i}.Child{j}]" for j in range(3)) for i in range(4))
+        model = self.Model.loads(text)
+        boxes = arrange(model)
+        for rank in (0, 1):
+            with self.subTest(rank=rank):
+                row = sorted((b for b in boxes.values() if b.rank == rank), key=lambda b: b.x)
+                for a, b in zip(row, row[1:]):
+                    self.assertLessEqual(a.x + a.width / 2, b.x - b.width / 2)
+
+    def test_nesting(self):
+        text = """
+        [A]
+        [A.B]
+        [A.C]
+        [D]
+        [D.E]
+        [D.F]
+        [A.B.x]
+        target = "D.F"
+        [A.C.y]
+        target = "D.E"
+        """
+        model = self.Model.loads(text)
+        boxes = arrange(model, sweeps=0)
+        self.assertEqual(1, self.crossings(model, boxes))
+        boxes = arrange(model)
+        self.assertEqual(0, self.crossings(model, boxes))
+        left = sorted(boxes[i].x for i in ("A.B", "A.C"))
+        right = sorted(boxes[i].x for i in ("D.E", "D.F"))
+        self.assertLess(left[-1], right[0])
+
+    def test_svg(self):
+        text = """
+        [A]
+        label = "Q & A"
+        [A.B]
+        [A.B.x]
+        target = "A"
+        stroke = {"r" = 255, "g" = 0, "b" = 0, "a" = 128}
+        """
+        model = self.Model.loads(text)
+        rv = "\n".join(to_svg(model, label="<test>"))
+        root = self.parse(rv)
+        ns = "{http://www.w3.org/2000/svg}"
+        self.assertEqual(2, len(root.findall(f".//{ns}rect")))
+        self.assertEqual(["<test>"], [i.text for i in root.findall(f"{ns}title")])
+        self.assertIn("Q & A", [i.text for i in root.findall(f".//{ns}text")])
+        self.assertIn('stroke="#ff0000" stroke-opacity="0.50"', rv)
+
+    def test_empty(self):
+        model = self.Model.loads("")
+        root = self.parse("\n".join(to_svg(model)))
+        self.assertEqual([], root.findall(".//{http://www.w3.org/2000/svg}rect"))
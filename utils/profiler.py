@@ -0,0 +1,135 @@
+#! /usr/bin/env python
+# encoding: utf-8
+
+import contextlib
+import functools
+import io
+import sys
+import time
+import tracemalloc
+import unittest
+
+
+"""
+This module records the time and memory spent in each phase of a tool.
+
+"""
+
+
+class Profiler:
+
+    def __init__(self, enabled=True, clock=time.perf_counter):
+        self.enabled = enabled
+        self.clock = clock
+        self.phases = {}
+        self.counts = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Measure the code in this context as the named phase.
+        Allocations are net bytes still held at the end of the phase;
+        peak is the highest memory in use during it, above that at its start.
+
+        """
+        if not self.enabled:
+            yield self
+            return
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        start = self.clock()
+        try:
+            yield self
+        finally:
+            seconds = self.clock() - start
+            current, peak = tracemalloc.get_traced_memory()
+            record = self.phases.setdefault(name, dict(seconds=0.0, allocated=0, peak=0))
+            record["seconds"] += seconds
+            record["allocated"] += current - before
+            record["peak"] = max(record["peak"], peak - before)
+
+    def count(self, **kwargs):
+        if self.enabled:
+            self.counts.update(kwargs)
+
+    def caches(self, **kwargs):
+        "Count the hits and misses of functions memoized by functools."
+        for name, func in kwargs.items():
+            info = func.cache_info()
+            self.count(**{f"{name}.hits": info.hits, f"{name}.misses": info.misses})
+
+    def report(self, stream=sys.stderr, format="text"):
+        if format == "json":
+            import json
+            print(json.dumps(dict(phases=self.phases, counts=self.counts), indent=2), file=stream)
+            return
+
+        width = max((len(i) for i in list(self.phases) + list(self.counts)), default=0)
+        print(f"{'phase':<{width}} {'seconds':>10} {'allocated':>12} {'peak':>12}", file=stream)
+        for name, record in self.phases.items():
+            print(
+                f"{name:<{width}} {record['seconds']:>10.4f}"
+                f" {record['allocated']:>12,} {record['peak']:>12,}",
+                file=stream
+            )
+        for name, value in self.counts.items():
+            print(f"{name:<{width}} {value:>10}", file=stream)
+
+    def stop(self):
+        if self.enabled and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+class TestProfiler(unittest.TestCase):
+
+    def tearDown(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def test_disabled(self):
+        profiler = Profiler(enabled=False)
+        with profiler.phase("read"):
+            profiler.count(tables=1)
+        self.assertEqual({}, profiler.phases)
+        self.assertEqual({}, profiler.counts)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_phase(self):
+        ticks = iter(range(0, 10, 2))
+        profiler = Profiler(clock=lambda: next(ticks))
+        with profiler.phase("parse"):
+            data = [bytes(1024) for i in range(16)]
+        with profiler.phase("parse"):
+            pass
+        self.assertEqual(16, len(data))
+        record = profiler.phases["parse"]
+        self.assertEqual(4, record["seconds"])
+        self.assertGreaterEqual(record["allocated"], 16 * 1024)
+        self.assertGreaterEqual(record["peak"], record["allocated"])
+
+    def test_caches(self):
+        profiler = Profiler()
+        func = functools.cache(lambda x: x)
+        func(1)
+        func(1)
+        profiler.caches(func=func)
+        self.assertEqual({"func.hits": 1, "func.misses": 1}, profiler.counts)
+
+    def test_report(self):
+        import json
+        profiler = Profiler()
+        with profiler.phase("read"):
+            pass
+        profiler.count(nodes=3)
+        stream = io.StringIO()
+        profiler.report(stream, format="json")
+        rv = json.loads(stream.getvalue())
+        self.assertEqual({"read"}, set(rv["phases"]))
+        self.assertEqual({"nodes": 3}, rv["counts"])
+
+        stream = io.StringIO()
+        profiler.report(stream)
+        self.assertEqual(3, len(stream.getvalue().splitlines()))
@@ -0,0 +1,407 @@
+#! /usr/bin/env python
+# encoding: utf-8
+
+import argparse
+import asyncio
+from collections import deque
+from collections import OrderedDict
+import concurrent.futures
+import ipaddress
+import json
+import pathlib
+import statistics
+import sys
+import tempfile
+import time
+import unittest
+import urllib.parse
+
+from utils.cache import Cache
+from utils.toml2dot import load
+from utils.toml2dot import lines
+from utils.toml2dot import parser as options
+from utils.toml2dot import prepare
+from utils.toml2dot import rendered
+
+
+"""
+This utility renders TOML graphs on request, for editors which preview them as they are edited.
+
+Usage:
+
+    python -m utils.server --port 8642
+
+    curl --data-binary @design/taxonomy.toml "http://127.0.0.1:8642/render?digraph=1"
+    curl http://127.0.0.1:8642/stats
+
+POST /render takes the text of a TOML file and returns its DOT. The query
+may set `cluster`, `digraph`, `svg`, `interpolate`, `label`, `name`, `root`,
+`depth`, `hops` and `collapse-depth` as for utils.toml2dot. GET /stats reports the model cache
+and the latency of renders as JSON.
+
+Parsed Models are kept in a cache of the most recently used, by a digest
+of their text. Requests are served concurrently; parsing and rendering are
+done one at a time in a worker thread, so that the server stays responsive
+while a large file is parsed, and a Model is never rendered by two threads
+at once. Requests for the same text while it is parsed wait for the one
+parse. The server listens only on the loopback interface or a Unix socket.
+
+"""
+
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 422: "Unprocessable Entity"}
+FLAGS = ("cluster", "digraph", "svg", "interpolate")
+VALUES = ("label", "root", "depth", "hops", "collapse-depth", "library")
+
+
+class Service:
+
+    def __init__(self, limit=64, samples=1024):
+        self.limit = limit
+        self.models = OrderedDict()
+        self.pending = {}
+        self.worker = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.latency = deque(maxlen=samples)
+        self.counts = dict(requests=0, renders=0, errors=0, hits=0, misses=0, waits=0, evictions=0)
+
+    def close(self):
+        self.worker.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def parse(text, interpolate=False, library=None):
+        "Load a Model, building what every render needs, and check it for problems."
+        model = load(text, interpolate=interpolate, library=library)
+        problems = model.validate()
+        if not problems:
+            model.hierarchy
+        return model, problems
+
+    @staticmethod
+    def draw(model, name, args):
+        "Render the Model, or the part of it selected by args."
+        return rendered(prepare(model, args), name, args)
+
+    async def model(self, text, args):
+        "Return a Model of the text and its problems, from the cache if it has been seen recently."
+        key = Cache.digest(text, str(args.interpolate), str(args.library))
+        try:
+            self.models.move_to_end(key)
+            self.counts["hits"] += 1
+            return self.models[key]
+        except KeyError:
+            pass
+
+        if key in self.pending:
+            self.counts["waits"] += 1
+            return await asyncio.shield(self.pending[key])
+
+        self.counts["misses"] += 1
+        loop = asyncio.get_running_loop()
+        future = self.pending[key] = loop.run_in_executor(
+            self.worker, self.parse, text, args.interpolate, args.library
+        )
+        try:
+            rv = await future
+        finally:
+            del self.pending[key]
+
+        self.models[key] = rv
+        while len(self.models) > self.limit:
+            self.models.popitem(last=False)
+            self.counts["evictions"] += 1
+        return rv
+
+    def stats(self):
+        samples = sorted(self.latency)
+        latency = dict(count=len(samples))
+        if samples:
+            latency.update(
+                mean=statistics.fmean(samples),
+                p50=samples[len(samples) // 2],
+                p95=samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                max=samples[-1],
+            )
+        return dict(self.counts, models=len(self.models), limit=self.limit, latency_ms=latency)
+
+    async def render(self, query, body):
+        "Return the status, content type and body of the response to a render."
+        flags = [f"--{k}" for k in FLAGS if query.get(k, "0") not in ("", "0", "false")]
+        flags += [i for k in VALUES if k in query for i in (f"--{k}", query[k])]
+        try:
+            args = options().parse_args(flags)
+            text = body.decode("utf-8")
+        except (SystemExit, UnicodeDecodeError):
+            return 400, "text/plain", b"Bad options or text."
+
+        try:
+            model, problems = await self.model(text, args)
+        except Exception as e:
+            return 400, "text/plain", f"{type(e).__name__}: {e}".encode("utf-8")
+        if problems:
+            return 422, "text/plain", "\n".join(i.detail for i in problems).encode("utf-8")
+
+        loop = asyncio.get_running_loop()
+        try:
+            rv = await loop.run_in_executor(self.worker, self.draw, model, query.get("name", ""), args)
+        except KeyError:
+            return 400, "text/plain", f"No Node '{args.root}'.".encode("utf-8")
+        self.counts["renders"] += 1
+        return 200, "image/svg+xml" if args.svg else "text/vnd.graphviz", rv.encode("utf-8")
+
+    async def respond(self, method, target, body):
+        url = urllib.parse.urlsplit(target)
+        query = dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True))
+        if url.path == "/render":
+            if method != "POST":
+                return 405, "text/plain", b"Use POST."
+            start = time.perf_counter()
+            rv = await self.render(query, body)
+            self.latency.append((time.perf_counter() - start) * 1000)
+            return rv
+        elif url.path == "/stats":
+            return 200, "application/json", json.dumps(self.stats()).encode("utf-8")
+        return 404, "text/plain", b"Not found."
+
+    async def handle(self, reader, writer):
+        "Serve the requests of one connection, which is kept open unless the client asks otherwise."
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    method, target, version = None, None, "HTTP/1.0"
+
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+
+                self.counts["requests"] += 1
+                if method is None:
+                    status, kind, data = 400, "text/plain", b"Bad request."
+                else:
+                    status, kind, data = await self.respond(method, target, body)
+                if status != 200:
+                    self.counts["errors"] += 1
+
+                close = version == "HTTP/1.0" or headers.get("connection", "").lower() == "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    f"Content-Type: {kind}; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+def loopback(host):
+    "Return True if host is an address of the loopback interface."
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+async def start(service, host="127.0.0.1", port=8642, path=None):
+    """
+    Start a server for the service, on a Unix socket if path is given.
+    Raise ValueError if host is not a loopback address.
+
+    """
+    if path is not None:
+        return await asyncio.start_unix_server(service.handle, path=str(path))
+    if not loopback(host):
+        raise ValueError(f"Host {host} is not a loopback address.")
+    return await asyncio.start_server(service.handle, host=host, port=port)
+
+
+async def fetch(method, target, body=b"", host="127.0.0.1", port=8642, path=None):
+    "Make one request of a server. Return the status, headers and body of the response."
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(str(path))
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(
+            f"{method} {target} HTTP/1.1\r\nHost: {host}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return status, headers, await reader.readexactly(int(headers["content-length"]))
+    finally:
+        writer.close()
+
+
+class TestServer(unittest.IsolatedAsyncioTestCase):
+
+    text = "[A]\n[A.B]\n[A.x]\ntarget = \"B\"\n"
+
+    async def asyncSetUp(self):
+        self.service = Service(limit=2)
+        self.server = await start(self.service, port=0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.service.close()
+
+    async def fetch(self, method, target, body=b""):
+        return await fetch(method, target, body, port=self.port)
+
+    async def test_render(self):
+        status, headers, body = await self.fetch("POST", "/render?digraph=1&name=test", self.text.encode())
+        self.assertEqual(200, status)
+        args = options().parse_args(["--digraph"])
+        self.assertEqual("\n".join(lines(load(self.text), "test", args)) + "\n", body.decode())
+
+        status, headers, body = await self.fetch("POST", "/render?cluster=1", self.text.encode())
+        self.assertIn("subgraph cluster_a", body.decode())
+        status, headers, body = await self.fetch("POST", "/render?root=A.B", self.text.encode())
+        self.assertEqual(200, status)
+        self.assertEqual(1, self.service.counts["misses"])
+        self.assertEqual(2, self.service.counts["hits"])
+
+    async def test_loopback(self):
+        self.assertTrue(all(loopback(i) for i in ("127.0.0.1", "127.0.0.2", "::1", "localhost")))
+        self.assertFalse(any(loopback(i) for i in ("0.0.0.0", "::", "192.168.0.1", "example.com")))
+        with self.assertRaises(ValueError):
+            await start(self.service, host="0.0.0.0", port=0)
+
+    async def test_errors(self):
+        self.assertEqual(404, (await self.fetch("GET", "/nowhere"))[0])
+        self.assertEqual(405, (await self.fetch("GET", "/render"))[0])
+        self.assertEqual(400, (await self.fetch("POST", "/render", b"[A"))[0])
+        self.assertEqual(400, (await self.fetch("POST", "/render?depth=x", b"[A]"))[0])
+        self.assertEqual(400, (await self.fetch("POST", "/render?root=Z", b"[A]"))[0])
+        status, headers, body = await self.fetch("POST", "/render", b"[A]\n[A.x]\ntarget = \"Z\"\n")
+        self.assertEqual(422, status)
+        self.assertIn(b"No Node 'Z'", body)
+
+    async def test_concurrent(self):
+        texts = [self.text, self.text, self.text, "[C]\n", "[D]\n"]
+        rv = await asyncio.gather(*(self.fetch("POST", "/render", i.encode()) for i in texts))
+        self.assertEqual([200] * 5, [i[0] for i in rv])
+        self.assertEqual(rv[0][2], rv[2][2])
+        self.assertEqual(3, self.service.counts["misses"])
+        self.assertEqual(2, self.service.counts["hits"] + self.service.counts["waits"])
+        self.assertEqual(2, len(self.service.models))
+        self.assertEqual(1, self.service.counts["evictions"])
+
+    async def test_stats(self):
+        await self.fetch("POST", "/render", self.text.encode())
+        status, headers, body = await self.fetch("GET", "/stats")
+        self.assertEqual("application/json; charset=utf-8", headers["content-type"])
+        rv = json.loads(body)
+        self.assertEqual(1, rv["renders"])
+        self.assertEqual(1, rv["latency_ms"]["count"])
+        self.assertGreater(rv["latency_ms"]["max"], 0)
+
+    async def test_keep_alive(self):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        for n in range(2):
+            writer.write(b"GET /stats HTTP/1.1\r\n\r\n")
+            await writer.drain()
+            self.assertEqual(b"HTTP/1.1 200 OK\r\n", await reader.readline())
+            headers = {}
+            while (line := await reader.readline()) != b"\r\n":
+                name, _, value = line.decode().partition(":")
+                headers[name.lower()] = value.strip()
+            await reader.readexactly(int(headers["content-length"]))
+        writer.close()
+        self.assertEqual(2, self.service.counts["requests"])
+
+    async def test_unix_socket(self):
+        with tempfile.TemporaryDirectory() as parent:
+            path = pathlib.Path(parent, "render.sock")
+            server = await start(self.service, path=path)
+            try:
+                status, headers, body = await fetch("POST", "/render", self.text.encode(), path=path)
+                self.assertEqual(200, status)
+            finally:
+                server.close()
+                await server.wait_closed()
+
+
+async def serve(args):
+    service = Service(limit=args.models)
+    server = await start(service, host=args.host, port=args.port, path=args.socket)
+    where = args.socket or "http://{0}:{1}".format(*server.sockets[0].getsockname()[:2])
+    print(f"Serving on {where}", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(args):
+    if args.test:
+        suite = unittest.defaultTestLoader.loadTestsFromName("__main__")
+        unittest.TextTestRunner().run(suite)
+        return 0
+
+    try:
+        asyncio.run(serve(args))
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def parser():
+    rv = argparse.ArgumentParser(__doc__)
+    rv.add_argument(
+        "--host", default="127.0.0.1",
+        help="Set the loopback address to listen on [127.0.0.1]."
+    )
+    rv.add_argument(
+        "--port", default=8642, type=int,
+        help="Set the port to listen on [8642]."
+    )
+    rv.add_argument(
+        "--socket", default=None, type=pathlib.Path,
+        help="Listen on this Unix socket instead."
+    )
+    rv.add_argument(
+        "--models", default=64, type=int,
+        help="Set the number of parsed models to keep [64]."
+    )
+    rv.add_argument(
+        "--test", default=False, action="store_true",
+        help="Run unit tests."
+    )
+    return rv
+
+
+def run():
+    p = parser()
+    args = p.parse_args()
+    rv = main(args)
+    sys.exit(rv)
+
+
+if __name__ == "__main__":
+    run()
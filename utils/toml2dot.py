@@ -4,20 +4,41 @@
 import argparse
 from collections import Counter
 from collections import namedtuple
+from collections import OrderedDict
+import contextlib
 import dataclasses
 import functools
+import hashlib
+import importlib.util
+import io
+import itertools
+import os
 import pathlib
+import pickle
 import re
+import shutil
 import sys
-from textwrap import dedent
+import tempfile
 import unittest
+import weakref
 
-import toml
+from utils.batch import batch
+from utils.batch import expand
+from utils.batch import is_batch
+from utils.batch import summary
+from utils.backends import backend
+from utils.backends import BACKENDS
+from utils.backends import InlineTable
+from utils.cache import Cache
+from utils.profiler import Profiler
 
 
 """
 This utility translates a graph defined in a TOML file to an equivalent .dot
 
+A Node takes the weight, color, fill and stroke of its parent, save those its
+own table sets, so a style need only be given at the top of a subtree.
+
 Usage:
 
     python -m utils.toml2dot --label "Taxonomy MIDGET CABS 2P" --digraph \
@@ -25,18 +46,88 @@ Usage:
 
     dot -Tsvg design/taxonomy.dot > design/taxonomy.svg
 
+For graphs too large for Graphviz, lay out and write SVG directly:
+
+    python -m utils.toml2dot --svg design/taxonomy.toml > design/taxonomy.svg
+
+or fold each subtree below a rank into one Node, merging the arcs which meet it:
+
+    python -m utils.toml2dot --cluster --collapse-depth 1 design/taxonomy.toml > design/taxonomy.dot
+
+Given a directory or a glob, translate each file to one alongside it:
+
+    python -m utils.toml2dot --digraph "design/*.toml"
+
+Keep the output up to date while the file is edited, see utils.watch:
+
+    python -m utils.toml2dot --watch --output design/taxonomy.dot design/taxonomy.toml
+
+Draw only what changed between two versions, see utils.diff:
+
+    python -m utils.toml2dot --diff old.toml new.toml > changes.dot
+
+Export the graph as arrays for other tools to load, see utils.export:
+
+    python -m utils.toml2dot --export graph --output taxonomy.graph design/taxonomy.toml
+
 """
 
 
 RGBA = namedtuple("RGBA", ["r", "g", "b", "a"], defaults=(255,))
+BLACK = RGBA(0, 0, 0)
+
+Problem = namedtuple("Problem", ["kind", "name", "detail"])
 Arc = namedtuple(
     "Arc",
     ["label", "node", "target", "source", "weight", "color", "fill", "stroke"],
-    defaults=(None, 1.0, RGBA(0, 0, 0), RGBA(0, 0, 0), RGBA(0, 0, 0))
+    defaults=(None, 1.0, BLACK, BLACK, BLACK)
 )
 
 
-@dataclasses.dataclass(eq=False)
+PALETTE = {BLACK: BLACK}
+
+# The modules whose code shapes what is cached, and so its version
+SOURCES = ("toml2dot.py", "backends.py", "confuser.py", "layout.py", "export.py")
+
+
+def colour(r, g, b, a=255):
+    "Return the one shared RGBA instance for each distinct colour."
+    rv = RGBA(r, g, b, a)
+    return PALETTE.setdefault(rv, rv)
+
+
+@functools.lru_cache(maxsize=2 ** 14)
+def identifier(name):
+    "Return a short DOT ID for the named Node, the same in every run."
+    return "n" + hashlib.blake2b(name.encode("utf-8"), digest_size=8).hexdigest()
+
+
+@functools.lru_cache(maxsize=2 ** 10)
+def hexcode(rgba, alpha=True):
+    return f"#{rgba.r:02x}{rgba.g:02x}{rgba.b:02x}{rgba.a:02x}" if alpha else f"#{rgba.r:02x}{rgba.g:02x}{rgba.b:02x}"
+
+
+@functools.lru_cache(maxsize=2 ** 12)
+def style(weight, stroke, color, fill, alpha=(True, True, True)):
+    """
+    Format the DOT attributes of an item once for each distinct combination.
+    `alpha` selects which of the three colours are given their alpha channel.
+
+    """
+    return (
+        f"weight={weight:.02f}"
+        f' color="{hexcode(stroke, alpha[0])}"'
+        f' fontcolor="{hexcode(color, alpha[1])}"'
+        f' fillcolor="{hexcode(fill, alpha[2])}"'
+    )
+
+
+def attributes(label, attrs, default=None):
+    "Format the attribute list of an item, omitting those which match the default."
+    return f' [ label="{label}" ]' if attrs == default else f' [ label="{label}", {attrs} ]'
+
+
+@dataclasses.dataclass(eq=False, slots=True)
 class Node:
 
     name: str
@@ -46,9 +137,9 @@ class Node:
     arcs: list[Arc] = dataclasses.field(default_factory=list)
     data: dict = None
     parent: object = None
-    color: RGBA = RGBA(0, 0, 0)
-    fill: RGBA = RGBA(0, 0, 0)
-    stroke: RGBA = RGBA(0, 0, 0)
+    color: RGBA = BLACK
+    fill: RGBA = BLACK
+    stroke: RGBA = BLACK
 
     def __post_init__(self):
         self.label = self.label or self.name
@@ -60,19 +151,134 @@ class Node:
 
 class Model:
 
+    bare_key = re.compile("[A-Za-z0-9_-]+(\\.[A-Za-z0-9_-]+)*$")
+
+    @classmethod
+    def loads(cls, text, library=None):
+        "Parse text with the named TOML library, by default the first of utils.backends available."
+        data, entered = backend(library).loads(text)
+        return cls(text, data, entered=entered)
+
     @classmethod
-    def loads(cls, text):
-        data = toml.loads(text)
-        return cls(text, data)
+    def from_literals(cls, literals, library=None):
+        """
+        Build a Model from sections of literal TOML values, eg: `Conf.literals`.
+
+        The library is chosen as for `loads`, so that both accept the same documents.
+        With the `toml` library, each value is parsed by the decoder method
+        `toml.loads` applies to a line of text. Should any section or value need
+        more than that line parser (comments, multi-line values, quoted keys),
+        or should another library be chosen, the whole Model is loaded from text instead.
+
+        """
+        toml = backend(library)
+        if toml.name != "toml":
+            return cls.loads(cls.dumps(literals), toml.name)
+
+        decoder = toml.decoder()
+        data = decoder.get_empty_table()
+        implicit = set()
+        for name, section in literals.items():
+            if not cls.bare_key.match(name):
+                break
+
+            keys = name.split(".")
+            table = data
+            for n, key in enumerate(keys, start=1):
+                child = table.get(key)
+                if child is None:
+                    child = table[key] = decoder.get_empty_table()
+                    if n < len(keys):
+                        implicit.add(id(child))
+                elif not isinstance(child, dict):
+                    raise toml.module.TomlDecodeError(f"Key group '{name}' overwrites a value", name, 0)
+                elif n == len(keys):
+                    if id(child) not in implicit:
+                        raise toml.module.TomlDecodeError(f"Key group '{name}' already exists", name, 0)
+                    implicit.discard(id(child))
+                table = child
+
+            decoder.entered[id(table)] = table
+            for k, v in section.items():
+                if (
+                    not cls.bare_key.match(k) or not v or v.startswith(("'''", '"""'))
+                    or "#" in v or "\n" in v or "\r" in v
+                ):
+                    break
+
+                line = f"{k} = {v}"
+                try:
+                    decoder.load_line(line, table, None, False)
+                except ValueError as err:
+                    raise toml.module.TomlDecodeError(str(err), line, 0)
+            else:
+                continue
+            break
+        else:
+            return cls(None, data, entered=decoder.entered)
+
+        return cls.loads(cls.dumps(literals), toml.name)
+
+    @staticmethod
+    def dumps(literals):
+        "Join sections of literal TOML values into the text of a document, as does `Conf.dumps`."
+        return "\n".join(
+            line for name, section in literals.items()
+            for line in itertools.chain([f"[{name}]"], (f"{k} = {v}" for k, v in section.items()))
+        )
+
+    @staticmethod
+    def index(data):
+        """
+        Map the identity of every table in data to its dotted path and the table itself.
+        Each table in an array of tables is given its index, eg: 'A.B[0]'.
+
+        """
+        rv = {}
+        stack = [("", data)]
+        while stack:
+            path, table = stack.pop()
+            for k, v in table.items():
+                if type(v) is dict:
+                    key = path + k
+                    rv[id(v)] = (key, v)
+                    stack.append((key + ".", v))
+                elif type(v) is list and v and type(v[0]) is dict:
+                    for n, i in enumerate(v):
+                        key = f"{path}{k}[{n}]"
+                        rv[id(i)] = (key, i)
+                        stack.append((key + ".", i))
+        return rv
 
     @staticmethod
     def is_arc(table):
         return set(table.keys()).intersection({"source", "target"})
 
-    def __init__(self, text, data):
+    memoized = ("tables", "nodes", "hierarchy", "names", "targets", "forward", "reverse")
+    inherited = ("weight", "color", "fill", "stroke")
+
+    def __init__(self, text, data, entered=None, tables=None, nodes=None, limit=1024):
         self.text = text
         self.data = data
-        self.table_finder = re.compile("\[\s*([\.\w]+)\s*\]")
+        self.entered = entered
+        self.limit = limit
+        self.queries = OrderedDict()
+        self.stats = Counter()
+        self.given = {k: v for k, v in (("tables", tables), ("nodes", nodes)) if v is not None}
+        self.__dict__.update(self.given)
+
+    def invalidate(self):
+        "Discard everything computed from the data, so that it is computed again on demand."
+        for name in self.memoized:
+            self.__dict__.pop(name, None)
+        self.__dict__.update(self.given)
+        self.queries.clear()
+
+    def __getstate__(self):
+        return dict(text=self.text, data=self.data, tables=self.tables, nodes=self.nodes)
+
+    def __setstate__(self, state):
+        self.__init__(**state)
 
     @property
     def graphs(self):
@@ -90,20 +296,27 @@ class Model:
             else:
                 yield parent, k, v
 
-    @property
-    @functools.cache
+    @functools.cached_property
     def tables(self):
+        """
+        Map the dotted path of each declared table to its data, in document order.
+        A Model built without a record of the tables entered by the parser
+        must parse its text again to discover them.
+
+        """
+        index = self.index(self.data)
+        if self.entered is None:
+            if self.text is None:
+                raise ValueError("Model has neither text nor a record of its tables to find them from")
+            lookup = dict(index.values())
+            return {k: lookup[k] for k in self.loads(self.text).tables}
         rv = {}
-        for path in self.table_finder.findall(self.text):
-            keys = path.split(".")
-            data = self.data
-            for k in keys:
-                data = data[k]
-            rv[path] = data
+        for k in self.entered:
+            if k in index:
+                rv.setdefault(*index[k])
         return rv
 
-    @property
-    @functools.cache
+    @functools.cached_property
     def nodes(self):
         rv = {}
         arcs = {}
@@ -113,60 +326,344 @@ class Model:
                 arcs[name] = table
                 continue
 
-            colours = {attr: RGBA(**table[attr]) for attr in ("color", "fill", "stroke") if attr in table}
+            name = sys.intern(name)
+            colours = {attr: colour(**table[attr]) for attr in ("color", "fill", "stroke") if attr in table}
             kwargs = dict({k: v for k, v in table.items() if k in fields}, **colours)
             node = Node(name, **kwargs)
             node.data = table
-            if "." in name:
-                paths = name.split(".")
-                for gen in range(1, len(paths)):
-                    last = ".".join(paths[:-gen])
-                    if last in self.tables:
-                        node.parent = last
-
             rv[name] = node
 
+        for name, node in rv.items():
+            parent = name.rpartition(".")[0]
+            while parent and parent not in rv:
+                parent = parent.rpartition(".")[0]
+            node.parent = sys.intern(parent) if parent else None
+
+        self.cascade(rv)
+
         for name, table in arcs.items():
-            parent, dot, label = name.rpartition(".")
-            kwargs = {attr: RGBA(**table[attr]) for attr in ("color", "fill", "stroke") if attr in table}
+            parent = name.rpartition(".")[0]
+            if parent not in rv:
+                # An orphan; see Model.validate
+                continue
+
+            target = self.targets[name] or table.get("target")
+            kwargs = {attr: colour(**table[attr]) for attr in ("color", "fill", "stroke") if attr in table}
             arc = Arc(
-                table.get("label", label),
-                node=parent or None,
-                target=table.get("target"),
+                sys.intern(self.label(name, table)),
+                node=sys.intern(parent),
+                target=sys.intern(target) if isinstance(target, str) else target,
                 weight=table.get("weight", 1.0),
                 **kwargs
             )
-            try:
-                rv[parent].arcs.append(arc)
-            except AttributeError:
-                print(
-                    "Arc '", name, "' expects a Node for '", parent, "'.",
-                    sep="", file=sys.stderr
-                )
-            except KeyError:
-                print(
-                    "No Node '", parent, "' for Arc '", name, "'.",
-                    sep="", file=sys.stderr
-                )
+            rv[parent].arcs.append(arc)
 
         return rv
 
-    @functools.cache
-    def children(self, name):
-        return [
-            k for k, v in self.nodes.items()
-            if k != name and k.startswith(name)
+    def cascade(self, nodes):
+        """
+        Give each Node the `inherited` attributes of its parent which its own table does not set.
+        Each Node is resolved once, after its ancestors, so every Node of a subtree
+        shares the style objects of the Node which sets them. A Node whose ancestors
+        are not in this Model, eg: one made by `subset`, inherits from their tables.
+
+        """
+        done = set()
+        for node in nodes.values():
+            chain = []
+            while node is not None and node.name not in done:
+                chain.append(node)
+                node = nodes.get(node.parent)
+            for node in reversed(chain):
+                parent = nodes.get(node.parent)
+                if parent is None:
+                    values = self.ancestry(node.name)
+                else:
+                    values = {attr: getattr(parent, attr) for attr in self.inherited}
+                for attr, value in values.items():
+                    if attr not in node.data:
+                        setattr(node, attr, value)
+                done.add(node.name)
+
+    def ancestry(self, name):
+        "Return the inherited attributes set by the tables above a name in the data; the nearest prevails."
+        rv = {}
+        table = self.data
+        for key in name.split(".")[:-1]:
+            table = table.get(key) if isinstance(table, dict) else None
+            if not isinstance(table, dict):
+                break
+            if not self.is_arc(table):
+                rv.update({attr: table[attr] for attr in self.inherited if attr in table})
+        return {k: v if k == "weight" else colour(**v) for k, v in rv.items()}
+
+    @functools.cached_property
+    def names(self):
+        "The names of the Nodes, without building any."
+        return frozenset(k for k, t in self.tables.items() if not self.is_arc(t))
+
+    @functools.cached_property
+    def targets(self):
+        "Resolve the target of every arc to the name of a Node, or to None where there is none."
+        return {
+            name: self.resolve(name.rpartition(".")[0], table.get("target"), self.names)
+            for name, table in self.tables.items() if self.is_arc(table)
+        }
+
+    def retarget(self, names):
+        """
+        Take names for those of the Nodes, as when the Model holds part of a larger file.
+        Forget what depends on the targets of arcs only if that changes them, and say whether it did.
+
+        """
+        targets = {
+            name: self.resolve(name.rpartition(".")[0], table.get("target"), names)
+            for name, table in self.tables.items() if self.is_arc(table)
+        }
+        self.names = names
+        if targets == self.__dict__.setdefault("targets", targets):
+            return False
+
+        for name in ("nodes", "hierarchy", "forward", "reverse"):
+            self.__dict__.pop(name, None)
+        self.targets = targets
+        self.queries.clear()
+        return True
+
+    @staticmethod
+    def label(name, table):
+        return table.get("label", name.rpartition(".")[2].partition("[")[0])
+
+    @staticmethod
+    def resolve(node, target, names):
+        """
+        Find the name of the Node an arc from node means by target.
+        A target which begins with '.' is relative to the node itself.
+        Any other is taken as a full name if there is one, or else looked up
+        in each scope of the node in turn, nearest first.
+
+        """
+        if not isinstance(target, str) or not target:
+            return None
+
+        if target.startswith("."):
+            rv = f"{node}{target}"
+            return rv if rv in names else None
+
+        if target in names:
+            return target
+
+        scope = node
+        while scope:
+            rv = f"{scope}.{target}"
+            if rv in names:
+                return rv
+            scope = scope.rpartition(".")[0]
+        return None
+
+    def validate(self):
+        """
+        Check every arc in a single pass over the tables, returning a list of Problems.
+        An 'orphan' arc has no Node to leave, a 'dangling' arc no Node to enter,
+        and a 'duplicate' arc repeats the label and target of another from its Node.
+        Tables which share a dotted name, as when a quoted key holds a dot, are
+        reported 'duplicate' too; only the first of them is kept.
+
+        """
+        paths = Counter(path for path, table in self.index(self.data).values())
+        rv = [
+            Problem("duplicate", name, f"{n} tables have the name '{name}'.")
+            for name, n in paths.items() if n > 1
         ]
+        seen = {}
+        for name, table in self.tables.items():
+            if not self.is_arc(table):
+                continue
+
+            parent = name.rpartition(".")[0]
+            target = self.targets[name]
+            if parent not in self.names:
+                rv.append(Problem("orphan", name, f"No Node '{parent}' for Arc '{name}'."))
+            if target is None:
+                rv.append(Problem("dangling", name, f"No Node '{table.get('target')}' for Arc '{name}'."))
+                continue
+
+            key = (parent, self.label(name, table), target)
+            if key in seen:
+                rv.append(Problem("duplicate", name, f"Arc '{name}' repeats Arc '{seen[key]}'."))
+            else:
+                seen[key] = name
+        return rv
+
+    @functools.cached_property
+    def hierarchy(self):
+        """
+        Index the names of Nodes by the name of their parent.
+        Root Nodes are filed under None.
+
+        """
+        rv = {None: []}
+        for name, node in self.nodes.items():
+            rv.setdefault(name, [])
+            rv.setdefault(node.parent, []).append(name)
+        return rv
+
+    def offspring(self, name):
+        "Return the nearest descendants of the named Node which share the lowest rank."
+        names = self.hierarchy.get(name, [])
+        rank = min((self.nodes[i].rank for i in names), default=None)
+        return [i for i in names if self.nodes[i].rank == rank]
+
+    def children(self, name):
+        "Return all descendants of the named Node. Recent results are kept up to `limit`."
+        try:
+            rv = self.queries.pop(name)
+            self.stats["children.hits"] += 1
+        except KeyError:
+            self.stats["children.misses"] += 1
+            rv = []
+            stack = list(reversed(self.hierarchy.get(name, [])))
+            while stack:
+                child = stack.pop()
+                rv.append(child)
+                stack.extend(reversed(self.hierarchy[child]))
+            if len(self.queries) >= self.limit:
+                self.queries.popitem(last=False)
+
+        self.queries[name] = rv
+        return rv
 
     def subgraphs(self, parents=None):
-        parents = parents or [v for v in self.nodes.values() if not v.parent]
+        parents = parents or [self.nodes[i] for i in self.hierarchy[None]]
         for p in parents:
             yield p
-            children = [self.nodes[c] for c in self.children(p.name)]
+            children = [self.nodes[c] for c in self.hierarchy[p.name]]
             if children:
                 yield from self.subgraphs(children)
                 yield None
 
+    @staticmethod
+    def tags(table):
+        rv = table.get("graphs", [])
+        return rv if isinstance(rv, list) else [rv]
+
+    @functools.cached_property
+    def forward(self):
+        "Index the targets of arcs by the name of the Node each leaves, without building any Nodes."
+        rv = {}
+        for name, table in self.tables.items():
+            if self.is_arc(table):
+                target = self.targets[name]
+                if target is not None:
+                    rv.setdefault(name.rpartition(".")[0], []).append(target)
+        return rv
+
+    @functools.cached_property
+    def reverse(self):
+        "Index the sources of arcs by the name of the Node each enters."
+        rv = {}
+        for name, targets in self.forward.items():
+            for target in targets:
+                rv.setdefault(target, []).append(name)
+        return rv
+
+    def select(self, root=None, depth=None, hops=0):
+        """
+        Return the names of the Nodes in the subtree at root, down to depth ranks below it,
+        together with those within hops arcs of them in either direction.
+
+        """
+        names = {k for k, t in self.tables.items() if not self.is_arc(t)}
+        if root is not None and root not in names:
+            raise KeyError(root)
+
+        rv = {k for k in names if root is None or k == root or k.startswith(f"{root}.")}
+        if depth is not None:
+            rank = root.count(".") if root is not None else 0
+            rv = {k for k in rv if k.count(".") - rank <= depth}
+
+        frontier = rv
+        for n in range(hops):
+            frontier = {
+                j for i in frontier
+                for j in itertools.chain(self.forward.get(i, []), self.reverse.get(i, []))
+                if j in names and j not in rv
+            }
+            rv |= frontier
+        return rv
+
+    def subset(self, names, arcs=None):
+        """
+        Return a Model of only the named Nodes and the arcs between them.
+        The function `arcs` may reject arc tables further.
+
+        """
+        tables = {}
+        for name, table in self.tables.items():
+            if name in names:
+                tables[name] = table
+            elif self.is_arc(table) and (arcs is None or arcs(table)):
+                parent = name.rpartition(".")[0]
+                if parent in names and self.targets[name] in names:
+                    tables[name] = table
+        return Model(self.text, self.data, tables=tables)
+
+    def collapse(self, depth):
+        """
+        Return a Model in which each subtree below rank depth is folded into the Node at its top.
+        Arcs which meet a folded subtree are merged into one arc for each pair of Nodes shown,
+        labelled with their number and weighted with their sum. Arcs within a subtree are dropped.
+
+        """
+        shown = {}
+        hidden = Counter()
+        stack = [(name, None) for name in reversed(self.hierarchy[None])]
+        while stack:
+            name, top = stack.pop()
+            node = self.nodes[name]
+            top = name if top is None or node.rank <= depth else top
+            shown[name] = top
+            if top != name:
+                hidden[top] += 1
+            stack.extend((i, top) for i in reversed(self.hierarchy[name]))
+
+        nodes = {
+            name: dataclasses.replace(
+                node, arcs=[], label=f"{node.label} (+{hidden[name]})" if hidden[name] else node.label
+            )
+            for name, node in self.nodes.items() if shown[name] == name
+        }
+        merged = {}
+        for name, node in self.nodes.items():
+            source = shown[name]
+            for arc in node.arcs:
+                target = shown.get(arc.target, arc.target)
+                if not hidden[source] and not hidden[target]:
+                    nodes[source].arcs.append(arc)
+                elif source != target:
+                    key = (source, target)
+                    if key not in merged:
+                        merged[key] = [len(nodes[source].arcs), 0, 0.0]
+                        nodes[source].arcs.append(arc._replace(node=source, target=target))
+                    merged[key][1] += 1
+                    merged[key][2] += arc.weight
+
+        for (source, target), (pos, count, weight) in merged.items():
+            if count > 1:
+                nodes[source].arcs[pos] = nodes[source].arcs[pos]._replace(label=f"{count} arcs", weight=weight)
+
+        tables = {name: self.tables[name] for name in nodes}
+        return Model(self.text, self.data, tables=tables, nodes=nodes)
+
+    def view(self, graph):
+        """
+        Return a Model of only those Nodes tagged for graph, and the arcs between them.
+        An arc with no tags of its own belongs to every graph which holds both its ends.
+
+        """
+        names = {k for k, t in self.tables.items() if not self.is_arc(t) and graph in self.tags(t)}
+        return self.subset(names, arcs=lambda t: "graphs" not in t or graph in self.tags(t))
+
     def arcs(self):
         links = [
             (".".join(name.split(".")[:-1]), name)
@@ -184,14 +681,27 @@ class Model:
     def to_cluster(self, name="model", label=None, directed=True, strict=True):
         label = label or name
         arc_style = "->" if directed else "--"
+        node_alpha = (True, False, False)
+        arc_alpha = (False, False, False)
+
+        leaves = [node for node in self.nodes.values() if not self.hierarchy[node.name]]
+        node_default = self.common(style(n.weight, n.stroke, n.color, n.fill, node_alpha) for n in leaves)
+        arc_default = self.common(
+            style(a.weight, a.stroke, a.color, a.fill, arc_alpha)
+            for n in self.nodes.values() for a in n.arcs
+        )
 
         yield f"{'strict ' if strict else ''}{'digraph' if directed else 'graph'} {name} {{"
         yield f'    label="{label}"'
+        if node_default:
+            yield f"    node [ {node_default} ]"
+        if arc_default:
+            yield f"    edge [ {arc_default} ]"
         for node in self.subgraphs():
             if node is None:
                 yield ""
                 yield "}"
-            elif self.children(node.name):
+            elif self.hierarchy[node.name]:
                 node_name = node.name.lower().replace(".", "_")
                 yield ""
                 yield f"subgraph cluster_{node_name} {{"
@@ -199,85 +709,291 @@ class Model:
                 yield f"    weight={node.weight:.2f}"
                 yield ""
             else:
-                node_hash = hash(node)
-                yield (
-                    f"{node_hash}"
-                    f' ['
-                    f' label="{node.label}", weight={node.weight:.02f}'
-                    f' color="#{node.stroke.r:02x}{node.stroke.g:02x}{node.stroke.b:02x}{node.stroke.a:02x}"'
-                    f' fontcolor="#{node.color.r:02x}{node.color.g:02x}{node.color.b:02x}"'
-                    f' fillcolor="#{node.fill.r:02x}{node.fill.g:02x}{node.fill.b:02x}"'
-                    f' ]'
-                )
-
+                node_style = style(node.weight, node.stroke, node.color, node.fill, node_alpha)
+                yield f"{identifier(node.name)}{attributes(node.label, node_style, node_default)}"
 
         yield ""
 
         for node in self.nodes.values():
-            node_hash = hash(node)
+            node_id = identifier(node.name)
             for arc in node.arcs:
-                target_hash = hash(self.nodes[arc.target])
-                yield (
-                    f"{node_hash} {arc_style} {target_hash}"
-                    f' ['
-                    f' label="{arc.label}", weight={arc.weight:.02f}'
-                    f' color="#{arc.stroke.r:02x}{arc.stroke.g:02x}{arc.stroke.b:02x}"'
-                    f' fontcolor="#{arc.color.r:02x}{arc.color.g:02x}{arc.color.b:02x}"'
-                    f' fillcolor="#{arc.fill.r:02x}{arc.fill.g:02x}{arc.fill.b:02x}"'
-                    f' ]'
-                )
+                target_id = identifier(arc.target)
+                arc_attrs = style(arc.weight, arc.stroke, arc.color, arc.fill, arc_alpha)
+                yield f"{node_id} {arc_style} {target_id}{attributes(arc.label, arc_attrs, arc_default)}"
         yield ""
         yield "}"
 
-    def to_dot(self, name="model", label=None, directed=True, strict=True):
-        label = label or name
-        arc_style = "->" if directed else "--"
+    def node_styles(self, node):
+        "Return the style of a Node, the number of its offspring, and the styles of its arcs."
+        return (
+            style(node.weight, node.stroke, node.color, node.fill),
+            len(self.offspring(node.name)),
+            [style(a.weight, a.stroke, a.color, a.fill) for a in node.arcs]
+        )
 
+    @staticmethod
+    def tally(entries):
+        """
+        Count the styles of Nodes, of edges to their offspring, and of arcs, in the order
+        to_dot draws them, from the node_styles of each Node.
+
+        """
+        nodes = Counter()
+        offspring = Counter()
+        arcs = Counter()
+        for node_style, count, arc_styles in entries:
+            nodes[node_style] += 1
+            if count:
+                offspring[node_style] += count
+            for i in arc_styles:
+                arcs[i] += 1
+        return nodes, offspring, arcs
+
+    @staticmethod
+    def dot_header(label, directed=True, strict=True, node_default=None, edge_default=None):
         yield f'{"strict " if strict else ""}{"digraph" if directed else "graph"} "{label}" {{'
+        if node_default:
+            yield f"node [ {node_default} ]"
+        if edge_default:
+            yield f"edge [ {edge_default} ]"
         yield ""
 
-        for node in self.nodes.values():
-            node_hash = hash(node)
-            yield (
-                f"{node_hash}"
-                f' ['
-                f' label="{node.label}", weight={node.weight:.02f}'
-                f' color="#{node.stroke.r:02x}{node.stroke.g:02x}{node.stroke.b:02x}{node.stroke.a:02x}"'
-                f' fontcolor="#{node.color.r:02x}{node.color.g:02x}{node.color.b:02x}{node.color.a:02x}"'
-                f' fillcolor="#{node.fill.r:02x}{node.fill.g:02x}{node.fill.b:02x}{node.fill.a:02x}"'
-                f' ]'
-            )
+    def dot_node(self, node, arc_style, node_default=None, edge_default=None):
+        "Generate the lines of to_dot for one Node: itself, the edges to its offspring, and its arcs."
+        node_id = identifier(node.name)
+        node_style = style(node.weight, node.stroke, node.color, node.fill)
+        yield f"{node_id}{attributes(node.label, node_style, node_default)}"
 
-            ranks = sorted({self.nodes[i].rank for i in self.children(node.name)})
-            for child in [c for c in (self.nodes[i] for i in self.children(node.name)) if c.rank == ranks[0]]:
-                child_hash = hash(child)
-                yield (
-                    f"{node_hash} {arc_style} {child_hash}"
-                    f' ['
-                    f' label="...", weight={node.weight:.02f}'
-                    f' color="#{node.stroke.r:02x}{node.stroke.g:02x}{node.stroke.b:02x}{node.stroke.a:02x}"'
-                    f' fontcolor="#{node.color.r:02x}{node.color.g:02x}{node.color.b:02x}{node.color.a:02x}"'
-                    f' fillcolor="#{node.fill.r:02x}{node.fill.g:02x}{node.fill.b:02x}{node.fill.a:02x}"'
-                    f' ]'
-                )
+        child_attrs = attributes("...", node_style, edge_default)
+        for child in self.offspring(node.name):
+            yield f"{node_id} {arc_style} {identifier(child)}{child_attrs}"
 
+        for arc in node.arcs:
+            target_id = identifier(arc.target)
+            arc_attrs = style(arc.weight, arc.stroke, arc.color, arc.fill)
+            yield f"{node_id} {arc_style} {target_id}{attributes(arc.label, arc_attrs, edge_default)}"
+        yield ""
 
-            for arc in node.arcs:
-                target_hash = hash(self.nodes[arc.target])
-                yield (
-                    f"{node_hash} {arc_style} {target_hash}"
-                    f' ['
-                    f' label="{arc.label}", weight={arc.weight:.02f}'
-                    f' color="#{arc.stroke.r:02x}{arc.stroke.g:02x}{arc.stroke.b:02x}{arc.stroke.a:02x}"'
-                    f' fontcolor="#{arc.color.r:02x}{arc.color.g:02x}{arc.color.b:02x}{arc.color.a:02x}"'
-                    f' fillcolor="#{arc.fill.r:02x}{arc.fill.g:02x}{arc.fill.b:02x}{arc.fill.a:02x}"'
-                    f' ]'
-                )
-            yield ""
+    def to_dot(self, name="model", label=None, directed=True, strict=True):
+        label = label or name
+        arc_style = "->" if directed else "--"
+        nodes, offspring, arcs = self.tally(self.node_styles(n) for n in self.nodes.values())
+        node_default = self.common(nodes)
+        edge_default = self.common(offspring + arcs)
+
+        yield from self.dot_header(label, directed, strict, node_default, edge_default)
+        for node in self.nodes.values():
+            yield from self.dot_node(node, arc_style, node_default, edge_default)
 
         yield ""
         yield "}"
 
+    @staticmethod
+    def common(styles):
+        "Return the most common of the styles, or None if there are none."
+        return next((k for k, v in Counter(styles).most_common(1)), None)
+
+
+def load(text, cache=None, interpolate=False, profiler=None, library=None):
+    """
+    Load a Model from text, or from the cache when the text has been seen before.
+    With `interpolate`, apply substitutions to the text first, as does `utils.confuser`.
+    Raise ValueError if the text cannot be parsed or interpolated.
+
+    """
+    profiler = profiler or Profiler(enabled=False)
+    with profiler.phase("cache"):
+        model = cache and cache.get(text)
+
+    if not isinstance(model, Model):
+        if interpolate:
+            import configparser
+            from utils.confuser import Conf
+            with profiler.phase("interpolate"):
+                try:
+                    literals = Conf.loads(text).literals
+                except configparser.Error as e:
+                    raise ValueError(str(e)) from e
+            with profiler.phase("parse"):
+                model = Model.from_literals(literals, library)
+        else:
+            with profiler.phase("parse"):
+                model = Model.loads(text, library)
+
+        with profiler.phase("tables"):
+            model.tables
+
+        if cache:
+            with profiler.phase("nodes"):
+                model.nodes
+            with profiler.phase("cache"):
+                cache.put(text, model)
+    return model
+
+
+shared = {}
+
+
+def share(model):
+    "Make a Model available to the rendering functions of a worker process."
+    shared["model"] = model
+
+
+def render(graph, path, cluster=False, **kwargs):
+    "Render the view of a graph from the shared Model to the file at path."
+    model = shared["model"].view(graph)
+    writer = model.to_cluster(**kwargs) if cluster else model.to_dot(**kwargs)
+    with sink(path) as stream:
+        write(writer, stream)
+    return path
+
+
+def render_graphs(model, parent, jobs=None, cluster=False, **kwargs):
+    """
+    Render a view of each graph in the Model to its own file in parent.
+    The views are rendered in parallel by a pool of processes which share the one Model.
+
+    """
+    import concurrent.futures
+
+    parent = pathlib.Path(parent)
+    parent.mkdir(parents=True, exist_ok=True)
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs, initializer=share, initargs=(model,)
+    ) as pool:
+        jobs = {}
+        for graph in sorted(model.graphs, key=str):
+            path = parent.joinpath(re.sub("[^\\w.-]", "_", str(graph)) + ".dot")
+            options = dict(kwargs, label=kwargs.get("label") or str(graph))
+            jobs[graph] = pool.submit(render, graph, path, cluster=cluster, **options)
+        return {graph: job.result() for graph, job in jobs.items()}
+
+
+def lines(model, name="", args=None, boxes=None):
+    "Generate the output for a Model in the format chosen by the command line options."
+    args = args or parser().parse_args([])
+    if args.svg:
+        from utils.layout import arrange
+        from utils.layout import to_svg
+        return to_svg(model, boxes or arrange(model), label=args.label, directed=args.digraph)
+    elif args.cluster:
+        return model.to_cluster(name=name, label=args.label, directed=args.digraph, strict=False)
+    else:
+        return model.to_dot(name=name, label=args.label, directed=args.digraph, strict=False)
+
+
+def options(args, name=""):
+    "Return the settings which change the output for a Model, as strings for a cache key."
+    return [name] + [
+        f"{k}={getattr(args, k)!r}"
+        for k in ("label", "cluster", "digraph", "svg", "export", "root", "depth", "hops", "collapse_depth")
+    ]
+
+
+def rendered(model, name="", args=None, boxes=None):
+    "Return the whole output for a Model; bytes for a binary export, or else text."
+    args = args or parser().parse_args([])
+    if args.export:
+        from utils.export import dump
+        stream = io.BytesIO() if args.export == "graph" else io.StringIO()
+        dump(model, stream, args.export)
+    else:
+        stream = io.StringIO()
+        write(lines(model, name, args, boxes), stream)
+    return stream.getvalue()
+
+
+class Tee:
+    "A stream which passes what is written to another, and a copy to a binary stream."
+
+    def __init__(self, stream, copy):
+        self.stream = stream
+        self.copy = copy
+
+    def write(self, data):
+        self.copy.write(data if isinstance(data, bytes) else data.encode("utf-8"))
+        return self.stream.write(data)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def emit(model, path=None, name="", args=None, boxes=None, copy=None):
+    "Write the output for a Model to path, or else to stdout; and as it goes, to the binary stream copy."
+    args = args or parser().parse_args([])
+    with sink(path, binary=args.export == "graph") as stream:
+        if copy is not None:
+            stream = Tee(stream, copy)
+        if args.export:
+            from utils.export import dump
+            dump(model, stream, args.export)
+        else:
+            write(lines(model, name, args, boxes), stream)
+
+
+def prepare(model, args):
+    """
+    Return the part of a Model chosen by the command line options: the Nodes selected,
+    with each subtree below --collapse-depth folded. Raise KeyError for an unknown root.
+
+    """
+    if args.root is not None or args.depth is not None or args.hops:
+        model = model.subset(model.select(root=args.root, depth=args.depth, hops=args.hops))
+    if args.collapse_depth is not None:
+        model = model.collapse(args.collapse_depth)
+    return model
+
+
+def convert(source, target, args, cache=None):
+    "Translate one file of a batch. Raise ValueError if its Model has problems."
+    model = load(source.read_text(), cache, interpolate=args.interpolate, library=args.library)
+    problems = model.validate()
+    if problems:
+        raise ValueError("; ".join(i.detail for i in problems))
+
+    try:
+        model = prepare(model, args)
+    except KeyError:
+        raise ValueError(f"No Node '{args.root}'.")
+
+    emit(model, target, source.stem, args)
+    return len(model.nodes)
+
+
+@contextlib.contextmanager
+def sink(path=None, buffering=2 ** 16, binary=False):
+    """
+    Provide a buffered text stream for output, by default stdout.
+    A file is written under a temporary name and moved into place only on success.
+
+    """
+    if path is None:
+        yield sys.stdout.buffer if binary else sys.stdout
+        return
+
+    path = pathlib.Path(path)
+    fd, temp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with open(fd, "wb" if binary else "w", buffering=buffering) as stream:
+            yield stream
+        mask = os.umask(0)
+        os.umask(mask)
+        os.chmod(temp, 0o666 & ~mask)
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+
+def write(lines, stream):
+    "Write lines to stream as they are generated."
+    stream.writelines(f"{line}\n" for line in lines)
+    stream.flush()
+
 
 class TestLoad(unittest.TestCase):
 
@@ -294,6 +1010,13 @@ class TestLoad(unittest.TestCase):
         model = Model.loads(text)
         self.assertEqual(["A", "A.B.C", "D"], list(model.tables.keys()))
 
+    def test_tables_crlf(self):
+        text = pathlib.Path(__file__).parent.parent.joinpath("design", "taxonomy.toml").read_text()
+        model = Model.loads(text)
+        crlf = Model.loads(text.replace("\n", "\r\n"))
+        self.assertTrue(model.tables)
+        self.assertEqual(list(model.tables), list(crlf.tables))
+
     def test_table(self):
         text = """
         [A]
@@ -316,6 +1039,49 @@ class TestLoad(unittest.TestCase):
         model = Model.loads(text)
         self.assertEqual({"tag": 1}, model.tables["A.B.C"])
 
+    def test_tables_inline(self):
+        text = """
+        [A]
+        color = {"r" = 0, "g" = 0, "b" = 0}
+        sizes = [1, 2]
+        [A.B]
+        label = '''
+        [C]
+        '''
+        [D]"""
+        model = Model.loads(text)
+        self.assertEqual(["A", "A.B", "D"], list(model.tables.keys()))
+        self.assertIs(model.data["D"], model.tables["D"])
+
+    def test_tables_array(self):
+        text = """
+        [A]
+        [[A.uses]]
+        target = "B"
+        [[A.uses]]
+        target = "C"
+        [A.uses.D]
+        [B]
+        [C]
+        """
+        model = Model.loads(text)
+        self.assertEqual(
+            ["A", "A.uses[0]", "A.uses[1]", "A.uses[1].D", "B", "C"],
+            list(model.tables.keys())
+        )
+        self.assertEqual("C", model.tables["A.uses[1]"]["target"])
+        self.assertEqual(["uses", "uses"], [i.label for i in model.nodes["A"].arcs])
+
+    def test_tables_without_parser(self):
+        text = """
+        [A.B]
+        [A]
+        color = {"r" = 0, "g" = 0, "b" = 0}
+        """
+        model = Model(text, backend().loads(text)[0])
+        self.assertEqual(["A.B", "A"], list(model.tables.keys()))
+        self.assertIs(model.data["A"], model.tables["A"])
+
     def test_graphs_unique(self):
         text = """
         [A]
@@ -357,6 +1123,456 @@ class TestLoad(unittest.TestCase):
         self.assertIsInstance(model, Model)
 
 
+class TestLiterals(unittest.TestCase):
+
+    def assertEquivalent(self, text, library=None):
+        from utils.confuser import Conf
+        conf = Conf.loads(text)
+        expected = Model.loads(conf.dumps(), library)
+        model = Model.from_literals(conf.literals, library)
+        self.assertEqual(expected.data, model.data)
+        self.assertEqual(list(expected.tables), list(model.tables))
+        self.assertEqual(list(expected.nodes), list(model.nodes))
+        return model
+
+    @unittest.skipUnless(importlib.util.find_spec("toml"), "Needs toml")
+    def test_values(self):
+        text = """
+        [DEFAULT]
+        weight = 2.5
+        [A]
+        label = "day/night cycles"
+        flag = true
+        graphs = ["a", 'b']
+        [A.B.C]
+        count = 1_000
+        color = {"r" = 0, "g" = 128, "b" = 255}
+        [A.B]
+        label = ${A:label}
+        """
+        model = self.assertEquivalent(text, library="toml")
+        self.assertIsNone(model.text)
+        self.assertEqual("day/night cycles", model.nodes["A.B"].label)
+        self.assertEqual(RGBA(0, 128, 255), model.nodes["A.B.C"].color)
+        self.assertIsInstance(model.tables["A.B.C"]["color"], InlineTable)
+
+    def test_fallback(self):
+        text = """
+        [A]
+        label = "A" # comment
+        [B]
+        label = '''multi
+            line'''
+        """
+        model = self.assertEquivalent(text)
+        self.assertIsNotNone(model.text)
+        self.assertEqual("A", model.nodes["A"].label)
+
+    def test_library(self):
+        text = '[A]\ngraphs = ["a", 1]\n'
+        try:
+            Model.loads(text)
+        except ValueError:
+            self.assertRaises(ValueError, self.assertEquivalent, text)
+        else:
+            self.assertEqual(["a", 1], self.assertEquivalent(text).tables["A"]["graphs"])
+
+    def test_errors(self):
+        from utils.confuser import Conf
+        for text in (
+            "[A]\nB = 1\n[A.B]",
+            "[A]\n[A.B]\nlabel = unquoted",
+        ):
+            with self.subTest(text=text):
+                conf = Conf.loads(text)
+                self.assertRaises(ValueError, Model.loads, conf.dumps())
+                self.assertRaises(ValueError, Model.from_literals, conf.literals)
+
+    def test_taxonomy(self):
+        path = pathlib.Path(__file__).parent.parent.joinpath("design", "taxonomy.toml")
+        self.assertEquivalent(path.read_text())
+
+
+class TestStyle(unittest.TestCase):
+
+    text = """
+    [A]
+    [A.B]
+    [A.B.c]
+    target = "C"
+    [C]
+    fill = {"r" = 255, "g" = 0, "b" = 0, "a" = 128}
+    [D]
+    """
+
+    def test_hexcode(self):
+        self.assertEqual("#ff000080", hexcode(RGBA(255, 0, 0, 128)))
+        self.assertEqual("#ff0000", hexcode(RGBA(255, 0, 0, 128), alpha=False))
+
+    def test_memos_bounded(self):
+        for memo in (identifier, hexcode, style):
+            with self.subTest(memo=memo.__name__):
+                self.assertIsNotNone(memo.cache_info().maxsize)
+
+    def test_style_shared(self):
+        a = style(1.0, BLACK, BLACK, BLACK)
+        b = style(1, RGBA(0, 0, 0), BLACK, RGBA(0, 0, 0, 255))
+        self.assertIs(a, b)
+        self.assertEqual('weight=1.00 color="#000000ff" fontcolor="#000000ff" fillcolor="#000000ff"', a)
+
+    def test_to_dot_defaults(self):
+        model = Model.loads(self.text)
+        lines = list(model.to_dot())
+        default = style(1.0, BLACK, BLACK, BLACK)
+        self.assertIn(f"node [ {default} ]", lines)
+        self.assertIn(f"edge [ {default} ]", lines)
+        self.assertEqual(1, sum("weight=" in i for i in lines[3:]))
+        self.assertEqual(1, sum('fillcolor="#ff000080"' in i for i in lines))
+        self.assertTrue(any(i.endswith(' [ label="c" ]') for i in lines))
+
+    def test_to_cluster_defaults(self):
+        model = Model.loads(self.text)
+        lines = list(model.to_cluster())
+        self.assertIn('    node [ weight=1.00 color="#000000ff" fontcolor="#000000" fillcolor="#000000" ]', lines)
+        self.assertIn('    edge [ weight=1.00 color="#000000" fontcolor="#000000" fillcolor="#000000" ]', lines)
+        self.assertEqual(1, sum('fillcolor="#ff0000"' in i for i in lines))
+
+    def test_cascade(self):
+        text = """
+        [A.B.C]
+        [A.B.C.x]
+        target = "A"
+        [A]
+        weight = 2.0
+        color = {"r" = 255, "g" = 0, "b" = 0}
+        [A.B]
+        fill = {"r" = 0, "g" = 0, "b" = 255}
+        [A.D]
+        color = {"r" = 0, "g" = 255, "b" = 0}
+        """
+        model = Model.loads(text)
+        nodes = model.nodes
+        self.assertEqual(RGBA(255, 0, 0), nodes["A.B.C"].color)
+        self.assertIs(nodes["A"].color, nodes["A.B.C"].color)
+        self.assertEqual(RGBA(0, 0, 255), nodes["A.B.C"].fill)
+        self.assertEqual(BLACK, nodes["A"].fill)
+        self.assertEqual(RGBA(0, 255, 0), nodes["A.D"].color)
+        self.assertEqual(2.0, nodes["A.D"].weight)
+        self.assertEqual(BLACK, nodes["A.B.C"].arcs[0].color)
+
+        part = model.subset(model.select(root="A.B.C"))
+        self.assertIsNone(part.nodes["A.B.C"].parent)
+        self.assertEqual(RGBA(255, 0, 0), part.nodes["A.B.C"].color)
+        self.assertEqual(RGBA(0, 0, 255), part.nodes["A.B.C"].fill)
+        self.assertEqual(2.0, part.nodes["A.B.C"].weight)
+
+    def test_empty(self):
+        model = Model.loads("")
+        self.assertFalse(any("node [" in i for i in model.to_dot()))
+        self.assertFalse(any("edge [" in i for i in model.to_cluster()))
+
+
+class TestValidate(unittest.TestCase):
+
+    def test_resolve(self):
+        text = """
+        [A]
+        [A.B]
+        [A.B.C]
+        [A.B.C.absolute]
+        target = "A.B"
+        [A.B.C.relative]
+        target = ".D"
+        [A.B.C.D]
+        [A.B.C.sibling]
+        target = "E"
+        [A.B.E]
+        [A.B.C.scope]
+        target = "B"
+        [B]
+        """
+        model = Model.loads(text)
+        self.assertEqual(
+            {
+                "A.B.C.absolute": "A.B", "A.B.C.relative": "A.B.C.D",
+                "A.B.C.sibling": "A.B.E", "A.B.C.scope": "B",
+            },
+            model.targets
+        )
+        self.assertEqual(["A.B", "A.B.C.D", "A.B.E", "B"], [i.target for i in model.nodes["A.B.C"].arcs])
+        self.assertEqual([], model.validate())
+        self.assertEqual(4, sum(" -> " in i for i in model.to_dot() if "label=\"...\"" not in i))
+
+    def test_problems(self):
+        text = """
+        [A]
+        [A.x]
+        target = "B"
+        [A.y]
+        target = "C"
+        [A.z]
+        label = "x"
+        target = "B"
+        [B]
+        [orphan]
+        target = "A"
+        [B.none]
+        source = "A"
+        """
+        model = Model.loads(text)
+        self.assertEqual(
+            [
+                Problem("dangling", "A.y", "No Node 'C' for Arc 'A.y'."),
+                Problem("duplicate", "A.z", "Arc 'A.z' repeats Arc 'A.x'."),
+                Problem("orphan", "orphan", "No Node '' for Arc 'orphan'."),
+                Problem("dangling", "B.none", "No Node 'None' for Arc 'B.none'."),
+            ],
+            model.validate()
+        )
+        self.assertNotIn("nodes", model.__dict__)
+        self.assertEqual(["A", "B"], list(model.nodes))
+
+    def test_duplicate_tables(self):
+        text = """
+        [A]
+        [A."b.c"]
+        x = 1
+        [A.b.c]
+        y = 2
+        [D]
+        """
+        model = Model.loads(text)
+        self.assertEqual([Problem("duplicate", "A.b.c", "2 tables have the name 'A.b.c'.")], model.validate())
+        self.assertEqual(["A", "A.b.c", "D"], list(model.tables))
+        self.assertEqual({"x": 1}, model.tables["A.b.c"])
+
+
+class TestSelect(unittest.TestCase):
+
+    text = """
+    [A]
+    [A.B]
+    [A.B.C]
+    [A.B.C.x]
+    target = "D.E"
+    [A.F]
+    [D]
+    [D.E]
+    [D.E.y]
+    target = "G"
+    [G]
+    [H]
+    [H.z]
+    target = "missing"
+    """
+
+    def test_adjacency(self):
+        model = Model.loads(self.text)
+        self.assertEqual({"A.B.C": ["D.E"], "D.E": ["G"]}, model.forward)
+        self.assertEqual(["A.B.C"], model.reverse["D.E"])
+        self.assertNotIn("nodes", model.__dict__)
+
+    def test_select_root(self):
+        model = Model.loads(self.text)
+        self.assertEqual({"A", "A.B", "A.B.C", "A.F"}, model.select(root="A"))
+        self.assertEqual({"A.B", "A.B.C"}, model.select(root="A.B"))
+        self.assertRaises(KeyError, model.select, root="A.B.C.x")
+        self.assertRaises(KeyError, model.select, root="Z")
+
+    def test_select_depth(self):
+        model = Model.loads(self.text)
+        self.assertEqual({"A", "A.B", "A.F"}, model.select(root="A", depth=1))
+        self.assertEqual({"A", "D", "G", "H"}, model.select(depth=0))
+
+    def test_select_hops(self):
+        model = Model.loads(self.text)
+        self.assertEqual({"A.B.C", "D.E"}, model.select(root="A.B.C", hops=1))
+        self.assertEqual({"A.B.C", "D.E", "G"}, model.select(root="A.B.C", hops=2))
+        self.assertEqual({"G", "D.E"}, model.select(root="G", hops=1))
+        self.assertEqual({"H"}, model.select(root="H", hops=3))
+
+    def test_subset(self):
+        model = Model.loads(self.text)
+        part = model.subset(model.select(root="A.B.C", hops=2))
+        self.assertNotIn("nodes", model.__dict__)
+        self.assertEqual(["A.B.C", "D.E", "G"], list(part.nodes))
+        self.assertEqual(["D.E"], [i.target for i in part.nodes["A.B.C"].arcs])
+        self.assertEqual(["A.B.C", "D.E", "G"], part.hierarchy[None])
+        self.assertEqual(2, sum(" -- " in i for i in part.to_dot(directed=False)))
+
+    def test_collapse(self):
+        model = Model.loads(self.text)
+        part = model.collapse(1)
+        self.assertEqual(["A", "A.B", "A.F", "D", "D.E", "G", "H"], list(part.nodes))
+        self.assertEqual("A.B (+1)", part.nodes["A.B"].label)
+        self.assertEqual([("x", "A.B", "D.E")], [i[:3] for i in part.nodes["A.B"].arcs])
+        self.assertEqual([], part.hierarchy["A.B"])
+        self.assertEqual("A.B.C", model.nodes["A.B.C"].arcs[0].node)
+
+    def test_collapse_merged(self):
+        text = self.text + """
+        [A.F.w]
+        target = "D.E"
+        weight = 2.0
+        [A.F.v]
+        target = "A.B"
+        """
+        part = Model.loads(text).collapse(0)
+        self.assertEqual(["A", "D", "G", "H"], list(part.nodes))
+        self.assertEqual(["A (+3)", "D (+1)", "G", "H"], [i.label for i in part.nodes.values()])
+        self.assertEqual([("2 arcs", "A", "D", None, 3.0)], [i[:5] for i in part.nodes["A"].arcs])
+        self.assertEqual([("y", "D", "G")], [i[:3] for i in part.nodes["D"].arcs])
+        rv = "\n".join(part.to_cluster())
+        self.assertIn(f'{identifier("A")} -> {identifier("D")} [ label="2 arcs"', rv)
+        self.assertNotIn("subgraph", rv)
+
+    def test_collapse_options(self):
+        args = parser().parse_args(["--root", "A", "--hops", "1", "--collapse-depth", "1"])
+        part = prepare(Model.loads(self.text), args)
+        self.assertEqual(["A", "A.B", "A.F", "D.E"], list(part.nodes))
+        self.assertEqual(["D.E"], [i.target for i in part.nodes["A.B"].arcs])
+
+
+class TestGraphs(unittest.TestCase):
+
+    text = """
+    [A]
+    graphs = ["a", "b"]
+    [A.B]
+    graphs = "a"
+    [A.B.c]
+    target = "C"
+    [A.B.d]
+    target = "A"
+    graphs = ["b"]
+    [A.B.e]
+    target = "A"
+    [C]
+    graphs = ["a", "b"]
+    [D]
+    """
+
+    def test_view(self):
+        model = Model.loads(self.text)
+        view = model.view("a")
+        self.assertEqual(["A", "A.B", "C"], list(view.nodes))
+        self.assertEqual(["C", "A"], [i.target for i in view.nodes["A.B"].arcs])
+        self.assertEqual(["A", "C"], view.hierarchy[None])
+
+    def test_view_arcs(self):
+        model = Model.loads(self.text)
+        view = model.view("b")
+        self.assertEqual(["A", "C"], list(view.nodes))
+        self.assertFalse(any(i.arcs for i in view.nodes.values()))
+
+    def test_render_graphs(self):
+        model = Model.loads(self.text)
+        with tempfile.TemporaryDirectory() as parent:
+            rv = render_graphs(model, parent, jobs=2, name="test", directed=False)
+            self.assertEqual({"a", "b"}, set(rv))
+            self.assertEqual(
+                {"a.dot", "b.dot"}, {i.name for i in pathlib.Path(parent).iterdir()}
+            )
+            text = rv["a"].read_text()
+            self.assertIn('label="A.B"', text)
+            self.assertNotIn('label="D"', text)
+            self.assertEqual(3, text.count(" -- "))
+
+
+class TestMemory(unittest.TestCase):
+
+    text = """
+    [A]
+    [A.B]
+    [A.B.c]
+    target = "C"
+    [C]
+    """
+
+    def test_collected(self):
+        model = Model.loads(self.text)
+        model.nodes
+        model.hierarchy
+        model.children("A")
+        list(model.to_dot())
+        list(model.to_cluster())
+        ref = weakref.ref(model)
+        del model
+        self.assertIsNone(ref())
+
+    def test_invalidate(self):
+        model = Model.loads(self.text)
+        self.assertEqual(["A.B"], model.children("A"))
+        model.data["A"]["D"] = {}
+        model.entered[id(model.data["A"]["D"])] = model.data["A"]["D"]
+        self.assertEqual(["A.B"], model.children("A"))
+        model.invalidate()
+        self.assertEqual(["A.B", "A.D"], model.children("A"))
+
+    def test_invalidate_given(self):
+        model = Model.loads(self.text)
+        subset = model.subset({"A", "A.B"})
+        subset.invalidate()
+        self.assertEqual(["A", "A.B"], list(subset.nodes))
+
+        collapsed = model.collapse(0)
+        collapsed.invalidate()
+        self.assertEqual(["A", "C"], list(collapsed.nodes))
+        self.assertEqual("A (+1)", collapsed.nodes["A"].label)
+
+    @unittest.skipUnless(importlib.util.find_spec("toml"), "Needs toml")
+    def test_invalidate_literals(self):
+        model = Model.from_literals({"A": {"x": "1"}, "A.B": {}}, library="toml")
+        model = pickle.loads(pickle.dumps(model))
+        model.invalidate()
+        self.assertEqual(["A", "A.B"], list(model.tables))
+
+        model = Model(None, model.data)
+        self.assertRaises(ValueError, getattr, model, "tables")
+
+    def test_children_bounded(self):
+        model = Model.loads(self.text)
+        model.limit = 2
+        for name in ("A", "A.B", "C", "A"):
+            model.children(name)
+        self.assertEqual(["C", "A"], list(model.queries))
+        self.assertEqual(0, model.stats["children.hits"])
+        model.children("C")
+        self.assertEqual(["A", "C"], list(model.queries))
+        self.assertEqual(1, model.stats["children.hits"])
+
+
+class TestPickle(unittest.TestCase):
+
+    def test_round_trip(self):
+        text = """
+        [A]
+        [A.B]
+        [A.B.c]
+        target = "C"
+        [C]
+        color = {"r" = 0, "g" = 0, "b" = 0}
+        """
+        model = pickle.loads(pickle.dumps(Model.loads(text)))
+        self.assertEqual(["A", "A.B", "A.B.c", "C"], list(model.tables))
+        self.assertEqual(["A", "A.B", "C"], list(model.nodes))
+        self.assertIs(model.tables["A.B"], model.nodes["A.B"].data)
+        self.assertIs(model.tables["A"], model.data["A"])
+        self.assertEqual("C", model.nodes["A.B"].arcs[0].target)
+        self.assertEqual(["A.B"], model.hierarchy["A"])
+
+    def test_cached(self):
+        text = """
+        [A]
+        [A.B]
+        """
+        with tempfile.TemporaryDirectory() as path:
+            cache = Cache(path)
+            self.assertEqual(Model.loads(text).nodes.keys(), load(text, cache).nodes.keys())
+            self.assertEqual(["A", "A.B"], list(load(text, cache).nodes))
+            self.assertEqual(1, cache.hits)
+
+
 class TestNode(unittest.TestCase):
 
     def test_node_defaults(self):
@@ -368,6 +1584,41 @@ class TestNode(unittest.TestCase):
         self.assertEqual([], node.arcs)
         self.assertTrue(hash(node))
 
+    def test_node_slots(self):
+        node = Node(name="test node")
+        self.assertFalse(hasattr(node, "__dict__"))
+        self.assertIs(BLACK, node.color)
+        self.assertIs(node.fill, node.stroke)
+
+    def test_node_colours_shared(self):
+        text = """
+        [A]
+        color = {"r" = 0, "g" = 0, "b" = 0}
+        fill = {"r" = 255, "g" = 255, "b" = 255}
+        [B]
+        fill = {"r" = 255, "g" = 255, "b" = 255, "a" = 255}
+        [B.a]
+        target = "A"
+        fill = {"r" = 255, "g" = 255, "b" = 255}
+        """
+        model = Model.loads(text)
+        self.assertIs(BLACK, model.nodes["A"].color)
+        self.assertIs(model.nodes["A"].fill, model.nodes["B"].fill)
+        self.assertIs(model.nodes["A"].fill, model.nodes["B"].arcs[0].fill)
+        self.assertEqual(RGBA(255, 255, 255, 255), model.nodes["B"].fill)
+
+    def test_node_names_interned(self):
+        text = """
+        [A]
+        [A.B]
+        [A.B.a]
+        target = "A"
+        """
+        model = Model.loads(text)
+        a = model.nodes["A"]
+        self.assertIs(a.name, model.nodes["A.B"].parent)
+        self.assertIs(a.name, model.nodes["A.B"].arcs[0].target)
+
     def test_node_parent_root(self):
         text = """
         [A]
@@ -428,6 +1679,64 @@ class TestNode(unittest.TestCase):
         self.assertEqual(2, model.nodes["A.B.C"].rank)
         print(model.children("A"))
 
+    def test_node_parent_nearest(self):
+        text = """
+        [A]
+        [A.B]
+        [A.B.C.D]
+        """
+        model = Model.loads(text)
+        self.assertEqual("A", model.nodes["A.B"].parent)
+        self.assertEqual("A.B", model.nodes["A.B.C.D"].parent)
+
+    def test_node_children_prefix(self):
+        text = """
+        [A]
+        [AB]
+        [A.B]
+        [AB.C]
+        """
+        model = Model.loads(text)
+        self.assertEqual(["A.B"], model.children("A"))
+        self.assertEqual(["AB.C"], model.children("AB"))
+
+    def test_node_children_descendants(self):
+        text = """
+        [A]
+        [A.B.C]
+        [A.D]
+        [A.B]
+        [A.D.E]
+        """
+        model = Model.loads(text)
+        self.assertEqual(["A.D", "A.B"], model.hierarchy["A"])
+        self.assertEqual(["A.D", "A.D.E", "A.B", "A.B.C"], model.children("A"))
+        self.assertEqual([], model.children("A.D.E"))
+
+    def test_node_offspring(self):
+        text = """
+        [A]
+        [A.B.C]
+        [A.D.E.F]
+        [G]
+        [G.H]
+        """
+        model = Model.loads(text)
+        self.assertEqual(["A.B.C"], model.offspring("A"))
+        self.assertEqual(["G.H"], model.offspring("G"))
+        self.assertEqual([], model.offspring("G.H"))
+
+    def test_subgraphs(self):
+        text = """
+        [A]
+        [A.B]
+        [A.B.C]
+        [D]
+        """
+        model = Model.loads(text)
+        rv = [i.name if i else i for i in model.subgraphs()]
+        self.assertEqual(["A", "A.B", "A.B.C", None, None, "D"], rv)
+
     def test_arc_labels(self):
         text = """
         [A.B]
@@ -454,12 +1763,216 @@ class TestNode(unittest.TestCase):
         self.assertEqual("C", model.nodes["C.B.C"].parent)
 
 
+class TestStartup(unittest.TestCase):
+
+    def test_lazy_imports(self):
+        "Modules needed only by some options are not imported to render one file."
+        import subprocess
+        code = "import sys, utils.toml2dot; print(*sys.modules)"
+        cwd = pathlib.Path(__file__).parent.parent
+        rv = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True, check=True)
+        modules = set(rv.stdout.split())
+        for name in (
+            "concurrent.futures", "configparser", "json", "toml",
+            "utils.confuser", "utils.diff", "utils.export", "utils.layout", "utils.watch",
+            "xml.etree.ElementTree",
+        ):
+            with self.subTest(name=name):
+                self.assertNotIn(name, modules)
+
+
+class TestOutput(unittest.TestCase):
+
+    def test_write_stream(self):
+        model = Model.loads("[A]\n[A.B]\n")
+        stream = io.StringIO()
+        write(model.to_dot(), stream)
+        self.assertEqual("\n".join(model.to_dot()) + "\n", stream.getvalue())
+
+    def test_sink_file(self):
+        with tempfile.TemporaryDirectory() as parent:
+            path = pathlib.Path(parent, "model.dot")
+            with sink(path) as stream:
+                write(["graph {", "}"], stream)
+                self.assertFalse(path.exists())
+            self.assertEqual("graph {\n}\n", path.read_text())
+            self.assertEqual([path], list(path.parent.iterdir()))
+
+    def test_sink_failure(self):
+        with tempfile.TemporaryDirectory() as parent:
+            path = pathlib.Path(parent, "model.dot")
+            path.write_text("previous")
+            with self.assertRaises(ValueError):
+                with sink(path) as stream:
+                    stream.write("graph {")
+                    raise ValueError
+            self.assertEqual("previous", path.read_text())
+            self.assertEqual([path], list(path.parent.iterdir()))
+
+    def test_batch(self):
+        with tempfile.TemporaryDirectory() as parent:
+            parent = pathlib.Path(parent)
+            parent.joinpath("good.toml").write_text("[A]\n[A.B]\n")
+            parent.joinpath("bad.toml").write_text("[A]\n[A.x]\ntarget = \"Z\"\n")
+            args = parser().parse_args(["--no-cache", "--jobs", "1", str(parent)])
+            with contextlib.redirect_stderr(io.StringIO()) as stream:
+                self.assertEqual(1, main(args))
+            self.assertIn("1 written, 0 up to date, 1 failed", stream.getvalue())
+            self.assertTrue(parent.joinpath("good.dot").read_text().startswith("graph \"good\" {"))
+            self.assertFalse(parent.joinpath("bad.dot").exists())
+
+            with contextlib.redirect_stderr(io.StringIO()) as stream:
+                main(args)
+            self.assertIn("0 written, 1 up to date, 1 failed", stream.getvalue())
+
+    def test_cache_sources(self):
+        parent = pathlib.Path(__file__).parent
+        self.assertTrue(all(parent.joinpath(i).is_file() for i in SOURCES))
+
+    def test_parse_errors(self):
+        with tempfile.TemporaryDirectory() as parent:
+            path = pathlib.Path(parent, "bad.toml")
+            for text in ("[A\n", "[A]\nx = ${B:y}\n"):
+                path.write_text(text)
+                args = parser().parse_args(["--no-cache", "--interpolate", str(path)])
+                with self.subTest(text=text), contextlib.redirect_stderr(io.StringIO()) as stream:
+                    self.assertEqual(1, main(args))
+                    self.assertTrue(stream.getvalue().startswith(f"{path}: "))
+
+    def test_identifiers(self):
+        "Output is the same from run to run."
+        import subprocess
+        code = "import utils.toml2dot as m; print(*m.Model.loads('[A]\\n[A.B]\\n[A.x]\\ntarget = \\'B\\'').to_dot(), sep='\\n')"
+        cwd = pathlib.Path(__file__).parent.parent
+        rv = [
+            subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True, check=True).stdout
+            for i in range(2)
+        ]
+        self.assertEqual(rv[0], rv[1])
+        self.assertIn(f"{identifier('A')} -> {identifier('A.B')}", rv[0])
+
+    def test_render_cache(self):
+        from unittest import mock
+        with tempfile.TemporaryDirectory() as parent:
+            parent = pathlib.Path(parent)
+            path = parent.joinpath("model.toml")
+            path.write_text("[A]\n[A.B]\n")
+            rv = []
+            for n, extra in enumerate(([], [], ["--digraph"])):
+                output = parent.joinpath(f"model{n}.dot")
+                args = parser().parse_args(["--cache", str(parent), "--output", str(output), *extra, str(path)])
+                with mock.patch.object(Model, "loads", wraps=Model.loads) as loads:
+                    self.assertEqual(0, main(args))
+                rv.append((loads.call_count, output.read_text()))
+
+            self.assertEqual(1, rv[0][0])
+            self.assertEqual((0, rv[0][1]), rv[1])
+            self.assertEqual(0, rv[2][0])
+            self.assertIn("digraph", rv[2][1])
+            self.assertNotIn("digraph", rv[0][1])
+
+    def test_diff(self):
+        with tempfile.TemporaryDirectory() as parent:
+            old = pathlib.Path(parent, "old.toml")
+            old.write_text("[A]\n[A.B]\n[C]\n")
+            new = pathlib.Path(parent, "new.toml")
+            new.write_text("[A]\n[A.B]\nlabel = \"Bee\"\n[C]\n")
+            output = pathlib.Path(parent, "diff.dot")
+            args = parser().parse_args(["--no-cache", "--diff", str(old), "--output", str(output), str(new)])
+            self.assertEqual(0, main(args))
+            rv = output.read_text()
+            self.assertIn("0 added, 0 removed, 1 modified", rv)
+            self.assertIn("Bee", rv)
+            self.assertNotIn(identifier("C"), rv)
+
+    def test_export(self):
+        from utils.export import Graph
+        with tempfile.TemporaryDirectory() as parent:
+            path = pathlib.Path(parent, "model.toml")
+            path.write_text("[A]\n[A.B]\n[A.x]\ntarget = \"B\"\n")
+            output = path.with_suffix(".graph")
+            args = parser().parse_args(["--no-cache", "--export", "graph", "--output", str(output), str(path)])
+            self.assertEqual(0, main(args))
+            with Graph.open(output) as graph:
+                self.assertEqual(["A.B"], [graph.name(i) for i in graph.targets(graph.find("A"))])
+
+
 def main(args):
     if args.test:
         suite = unittest.defaultTestLoader.loadTestsFromName("__main__")
         unittest.TextTestRunner().run(suite)
         return 0
+
+    if args.no_cache:
+        cache = None
     else:
+        version = Cache.digest(
+            __name__, *(pathlib.Path(__file__).with_name(i).read_bytes() for i in SOURCES),
+            str(args.interpolate), str(args.library)
+        )
+        cache = Cache(args.cache, version=version)
+
+    if args.diff:
+        if is_batch(args.input) or args.graphs or args.svg or args.export or args.watch:
+            print(
+                "Option --diff compares two files as DOT; it cannot be combined with"
+                " --graphs, --svg, --export, --watch or a batch.",
+                file=sys.stderr
+            )
+            return 2
+        from utils.diff import diff
+        from utils.diff import to_dot
+        models = []
+        for path in (args.diff, args.input):
+            text = path.read_text() if path else sys.stdin.read()
+            try:
+                model = load(text, cache, interpolate=args.interpolate, library=args.library)
+            except ValueError as e:
+                print(f"{path or 'stdin'}: {e}", file=sys.stderr)
+                return 1
+            problems = model.validate()
+            for problem in problems:
+                print(f"{path or 'stdin'}: {problem.detail}", file=sys.stderr)
+            if problems:
+                return 1
+            models.append(model)
+
+        label = args.label or f"{args.diff.name} to {args.input.name if args.input else 'stdin'}"
+        with sink(args.output) as stream:
+            write(to_dot(*models, diff(*models), label=label, directed=args.digraph), stream)
+        return 0
+
+    if args.graphs and args.collapse_depth is not None:
+        print("Option --collapse-depth cannot be combined with --graphs.", file=sys.stderr)
+        return 2
+
+    if is_batch(args.input):
+        if args.graphs:
+            print("Option --graphs is not available for a batch of files.", file=sys.stderr)
+            return 2
+        suffix = f".{args.export}" if args.export else ".svg" if args.svg else ".dot"
+        if args.output:
+            args.output.mkdir(parents=True, exist_ok=True)
+        outcomes = batch(
+            expand(args.input), convert,
+            lambda x: (args.output or x.parent).joinpath(x.stem + suffix),
+            args, cache, jobs=args.jobs, force=args.force
+        )
+        return 1 if summary(outcomes, sys.stderr) else 0
+
+    if args.watch:
+        if not args.input or not args.output or args.graphs:
+            print("Option --watch needs an input file and an --output file.", file=sys.stderr)
+            return 2
+        from utils.watch import watch
+        try:
+            watch(args.input, args)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    profiler = Profiler(enabled=bool(args.profile))
+    with profiler.phase("read"):
         if not args.input:
             text = sys.stdin.read()
             name = ""
@@ -467,13 +1980,81 @@ def main(args):
             text = args.input.read_text()
             name = args.input.stem
 
-    model = Model.loads(text)
-    if args.cluster:
-        writer = model.to_cluster(name=name, label=args.label, directed=args.digraph, strict=False)
-    else:
-        writer = model.to_dot(name=name, label=args.label, directed=args.digraph, strict=False)
-
-    print(*list(writer), sep="\n", file=sys.stdout)
+    renders = None
+    if cache and not args.graphs:
+        renders = Cache(cache.path, version=Cache.digest(cache.version, *options(args, name)), limit=cache.limit)
+        with profiler.phase("cache"):
+            stored = renders.open(text)
+        if stored is not None:
+            with profiler.phase("emit"), stored:
+                sys.stdout.flush()
+                with sink(args.output, binary=True) as stream:
+                    shutil.copyfileobj(stored, stream)
+            if args.profile:
+                profiler.count(**{"render.hits": renders.hits, "render.misses": renders.misses})
+                profiler.report(sys.stderr, format=args.profile)
+                profiler.stop()
+            return 0
+
+    try:
+        model = load(text, cache, interpolate=args.interpolate, profiler=profiler, library=args.library)
+    except ValueError as e:
+        print(f"{args.input or 'stdin'}: {e}", file=sys.stderr)
+        return 1
+
+    with profiler.phase("validate"):
+        problems = model.validate()
+    if problems:
+        for problem in problems:
+            print(problem.detail, file=sys.stderr)
+        print(f"{len(problems)} problem{'' if len(problems) == 1 else 's'} found.", file=sys.stderr)
+        return 1
+
+    with profiler.phase("select"):
+        try:
+            model = prepare(model, args)
+        except KeyError:
+            print(f"No Node '{args.root}'.", file=sys.stderr)
+            return 2
+
+    with profiler.phase("nodes"):
+        model.nodes
+    with profiler.phase("hierarchy"):
+        model.hierarchy
+
+    boxes = None
+    if args.svg and not args.graphs and not args.export:
+        from utils.layout import arrange
+        with profiler.phase("layout"):
+            boxes = arrange(model)
+
+    with profiler.phase("emit"):
+        if args.graphs:
+            render_graphs(
+                model, args.graphs, jobs=args.jobs, cluster=args.cluster,
+                name=name, label=args.label, directed=args.digraph, strict=False
+            )
+        elif renders:
+            with renders.writer(text) as copy:
+                emit(model, args.output, name, args, boxes, copy=copy)
+        else:
+            emit(model, args.output, name, args, boxes)
+
+    if args.profile:
+        profiler.count(
+            tables=len(model.tables),
+            nodes=len(model.nodes),
+            arcs=sum(len(i.arcs) for i in model.nodes.values()),
+        )
+        if cache:
+            profiler.count(**{"cache.hits": cache.hits, "cache.misses": cache.misses})
+        if renders:
+            profiler.count(**{"render.hits": renders.hits, "render.misses": renders.misses})
+        profiler.count(**model.stats)
+        profiler.caches(hexcode=hexcode, style=style)
+        profiler.report(sys.stderr, format=args.profile)
+        profiler.stop()
+    return 0
 
 
 def parser():
@@ -490,13 +2071,87 @@ def parser():
         "--digraph", "--directed", default=False, action="store_true",
         help="Make arcs directional."
     )
+    rv.add_argument(
+        "--svg", default=False, action="store_true",
+        help="Lay out the graph and write SVG instead of .dot."
+    )
+    rv.add_argument(
+        "--export", default=None, choices=["graph", "json"],
+        help="Write the graph as arrays in a binary or JSON file instead of drawing it."
+    )
+    rv.add_argument(
+        "--root", default=None,
+        help="Render only the subtree of this Node."
+    )
+    rv.add_argument(
+        "--depth", default=None, type=int,
+        help="Render only Nodes within this many ranks of the root."
+    )
+    rv.add_argument(
+        "--hops", default=0, type=int,
+        help="Also render Nodes within this many arcs of those selected."
+    )
+    rv.add_argument(
+        "--collapse-depth", default=None, type=int, metavar="N",
+        help="Fold each subtree below rank N into one Node, merging its arcs."
+    )
+    rv.add_argument(
+        "--graphs", default=None, type=pathlib.Path,
+        help="Write a file for each graph tag to this directory."
+    )
+    rv.add_argument(
+        "--jobs", default=None, type=int,
+        help="Set the number of processes which render graphs or files."
+    )
+    rv.add_argument(
+        "--force", default=False, action="store_true",
+        help="Translate every file of a batch, even those whose output is newer."
+    )
+    rv.add_argument(
+        "--diff", default=None, type=pathlib.Path, metavar="OLD",
+        help="Draw only what changed from this earlier version to the input."
+    )
+    rv.add_argument(
+        "--watch", default=False, action="store_true",
+        help="Render the input again each time it changes, until interrupted."
+    )
+    rv.add_argument(
+        "--profile", default=None, action="store_const", const="text",
+        help="Report the time and memory of each phase to stderr."
+    )
+    rv.add_argument(
+        "--profile-json", dest="profile", action="store_const", const="json",
+        help="Report the time and memory of each phase to stderr as JSON."
+    )
+    rv.add_argument(
+        "--interpolate", default=False, action="store_true",
+        help="Apply substitutions to the input, as does utils.confuser."
+    )
+    rv.add_argument(
+        "--library", default=None, choices=[i.name for i in BACKENDS],
+        help="Choose the TOML library [the first available of {0}].".format(
+            ", ".join(i.name for i in BACKENDS)
+        )
+    )
+    rv.add_argument(
+        "--cache", default=None, type=pathlib.Path,
+        help=f"Set cache directory [{Cache.default_path()}]."
+    )
+    rv.add_argument(
+        "--no-cache", default=False, action="store_true",
+        help="Parse the input without consulting the cache."
+    )
+    rv.add_argument(
+        "--output", default=None, type=pathlib.Path,
+        help="Set output file (written atomically), or directory for a batch."
+    )
     rv.add_argument(
         "--test", default=False, action="store_true",
         help="Run unit tests."
     )
     rv.add_argument(
         "input", nargs="?", type=pathlib.Path,
-        help="Set input file."
+        help="Set input file, or a directory or glob of them."
     )
     return rv
 
@@ -0,0 +1,462 @@
+#! /usr/bin/env python
+# encoding: utf-8
+
+import bisect
+from collections import Counter
+from collections import namedtuple
+import dataclasses
+import hashlib
+import importlib.util
+import io
+import itertools
+import pathlib
+import sys
+import tempfile
+import textwrap
+import time
+import unittest
+
+from utils.backends import backend
+from utils.toml2dot import lines
+from utils.toml2dot import Model
+from utils.toml2dot import parser
+from utils.toml2dot import prepare
+from utils.toml2dot import sink
+from utils.toml2dot import write
+
+
+"""
+This module keeps a Model in memory while its file is edited, and renders
+it again each time the file changes.
+
+The tables of the file are grouped by their top-level key, and the text of
+each group is hashed. The hashes of the groups, together with that of the
+text before any table and the order of the headers, make a hash of the
+whole file. After a change, only those groups whose hash differs are parsed
+again, and the lines already drawn for the Nodes of every other group are
+spliced into the output. The result is the same as rendering the whole file.
+
+Only the part of the file which differs from the last version is scanned
+for headers, so the cost of a change follows the size of the groups it
+touches rather than that of the file.
+
+"""
+
+
+Piece = namedtuple("Piece", ["names", "tally", "lines"])
+
+
+def digest(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def common(a, b, reverse=False, limit=None):
+    "Return the length of the longest common prefix, or suffix, of two strings, up to limit."
+    lo, hi = 0, min(len(a), len(b), len(a) if limit is None else limit)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        same = a[len(a) - mid:len(a) - lo] == b[len(b) - mid:len(b) - lo] if reverse else a[lo:mid] == b[lo:mid]
+        if same:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+@dataclasses.dataclass
+class Subtree:
+
+    digest: str
+    model: Model
+    own: frozenset
+    problems: list = None
+    pieces: dict = dataclasses.field(default_factory=dict)
+
+    def retarget(self, names):
+        "Resolve arcs against the names of the whole file, forgetting what depends on them if that changes."
+        if self.model.retarget(names):
+            self.problems = None
+            self.pieces.clear()
+
+    def piece(self, start, count):
+        "Return the Nodes of count tables from start, the tally of their styles, and their lines as drawn."
+        try:
+            return self.pieces[(start, count)]
+        except KeyError:
+            model = self.model
+            names = [k for k in itertools.islice(model.tables, start, start + count) if k in model.nodes]
+            tally = Model.tally(model.node_styles(model.nodes[k]) for k in names)
+            rv = self.pieces[(start, count)] = Piece(names, tally, {})
+            return rv
+
+
+class Incremental:
+    """
+    Render successive versions of a file, parsing only the groups of tables which change.
+    Options which select or fold part of the Model, or a format other than DOT,
+    are rendered in full each time. So is every version when the standard
+    library `tomllib` is not available to find the tables, or another is chosen.
+
+    """
+
+    def __init__(self, name="", args=None):
+        self.name = name
+        self.args = args or parser().parse_args([])
+        self.subtrees = {}
+        self.digest = None
+        self.output = None
+        self.problems = []
+        self.changed = 0
+        self.names = frozenset()
+        self.text = None
+        self.spans = []
+        self.preamble = None
+        self.values = {}
+        try:
+            self.scanner = backend("tomllib")
+        except ImportError:
+            self.scanner = None
+
+    @property
+    def incremental(self):
+        args = self.args
+        return self.scanner is not None and args.library in (None, self.scanner.name) and not (
+            args.cluster or args.svg or args.export or
+            args.root is not None or args.depth is not None or args.hops or
+            args.collapse_depth is not None
+        )
+
+    def scan(self, text):
+        """
+        Find the headers of text, and the top-level keys of those tables which may differ from the last text.
+        The keys are None when all may differ.
+
+        The text is scanned from the last header before it departs from the last
+        text, until a header after the two agree again falls on a header of the last.
+        From there on, the headers are those of the last text. This relies on the
+        last text having been valid TOML; `update` forgets any which was not.
+
+        """
+        old, spans = self.text, self.spans
+        self.text = text
+        if old is None:
+            self.spans = list(self.scanner.spans(text))
+            return self.spans, None
+
+        prefix = common(old, text)
+        boundary = len(text) - common(old, text, reverse=True, limit=min(len(old), len(text)) - prefix)
+        shift = len(text) - len(old)
+        starts = [i[2] for i in spans]
+
+        n = max(bisect.bisect_left(starts, prefix) - 1, 0)
+        pos = starts[n] if starts and starts[n] < prefix else 0
+        rescanned = []
+        end = len(spans)
+        for span in self.scanner.spans(text, pos):
+            if span[2] >= boundary:
+                m = bisect.bisect_left(starts, span[2] - shift)
+                if m < len(starts) and starts[m] == span[2] - shift:
+                    end = m
+                    break
+            rescanned.append(span)
+
+        touched = {i[0][0] for i in itertools.chain(rescanned, spans[n:end])}
+        first = rescanned[0][2] if rescanned else starts[end] + shift if end < len(starts) else len(text)
+        if n and first != pos:
+            touched.add(spans[n - 1][0][0])
+        self.spans = spans[:n] + rescanned + [(k, a, s + shift) for k, a, s in spans[end:]]
+        return self.spans, touched
+
+    def split(self, text):
+        """
+        Return the text before the first table, the hash of the tables under each top-level key,
+        and the runs of consecutive headers under the same key. The text of a group
+        is hashed again only when its tables may have changed.
+
+        """
+        spans, touched = self.scan(text)
+        preamble = text[:spans[0][2]] if spans else text
+        groups = {}
+        runs = []
+        for n, (keys, array, start) in enumerate(spans):
+            key = keys[0]
+            if runs and runs[-1][0] == key:
+                runs[-1][1] += 1
+            else:
+                runs.append([key, 1])
+            if touched is None or key in touched or key not in self.subtrees:
+                end = spans[n + 1][2] if n + 1 < len(spans) else len(text)
+                chunk = text[start:end]
+                groups.setdefault(key, []).append(chunk if chunk.endswith("\n") else chunk + "\n")
+            else:
+                groups.setdefault(key, None)
+        digests = {k: self.subtrees[k].digest if v is None else digest("".join(v)) for k, v in groups.items()}
+        chunks = {k: "".join(v) for k, v in groups.items() if v is not None}
+        return preamble, digests, chunks, runs
+
+    def update(self, text):
+        """
+        Return the lines of output for this version of the text, or None if its Model has problems.
+        `changed` counts the groups which were parsed again.
+
+        """
+        if not self.incremental:
+            model = Model.loads(text, self.args.library)
+            self.changed = 1
+            self.problems = model.validate()
+            return None if self.problems else list(lines(prepare(model, self.args), self.name, self.args))
+
+        try:
+            return self.render(*self.split(text))
+        except BaseException:
+            self.text = None
+            raise
+
+    def render(self, preamble, digests, chunks, runs):
+        "Draw the groups as split from the text, parsing those whose hash has changed."
+        root = digest("\0".join(itertools.chain(
+            [preamble], (f"{k}\0{v}" for k, v in digests.items()), (f"{k}\0{n}" for k, n in runs)
+        )))
+        if root == self.digest:
+            self.changed = 0
+            return self.output
+
+        if preamble != self.preamble:
+            self.values = self.scanner.module.loads(preamble)
+            self.preamble = preamble
+        for key in digests.keys() & self.values.keys():
+            raise ValueError(f"Key '{key}' is both a value and a table.")
+
+        subtrees = {}
+        self.changed = 0
+        for key, value in digests.items():
+            subtree = self.subtrees.get(key)
+            if subtree is None or subtree.digest != value:
+                model = Model.loads(chunks[key], self.scanner.name)
+                subtree = Subtree(value, model, model.names)
+                self.changed += 1
+            subtrees[key] = subtree
+
+        names = frozenset().union(*(i.own for i in subtrees.values()))
+        if names == self.names:
+            names = self.names
+        for subtree in subtrees.values():
+            if subtree.model.__dict__.get("names") is not names:
+                subtree.retarget(names)
+        self.subtrees = subtrees
+        self.names = names
+        self.digest = None
+
+        self.problems = []
+        for subtree in subtrees.values():
+            if subtree.problems is None:
+                subtree.problems = subtree.model.validate()
+            self.problems.extend(subtree.problems)
+        if self.problems:
+            return None
+
+        pieces = []
+        offsets = dict.fromkeys(subtrees, 0)
+        for key, count in runs:
+            subtree = subtrees[key]
+            pieces.append((subtree, subtree.piece(offsets[key], count)))
+            offsets[key] += count
+
+        nodes, offspring, arcs = Counter(), Counter(), Counter()
+        for subtree, piece in pieces:
+            nodes.update(piece.tally[0])
+            offspring.update(piece.tally[1])
+            arcs.update(piece.tally[2])
+        defaults = (Model.common(nodes), Model.common(offspring + arcs))
+        directed = self.args.digraph
+        arc_style = "->" if directed else "--"
+
+        rv = list(Model.dot_header(self.args.label or self.name, directed, False, *defaults))
+        for subtree, piece in pieces:
+            try:
+                rv.extend(piece.lines[defaults])
+            except KeyError:
+                model = subtree.model
+                piece.lines.clear()
+                piece.lines[defaults] = [
+                    line for name in piece.names
+                    for line in model.dot_node(model.nodes[name], arc_style, *defaults)
+                ]
+                rv.extend(piece.lines[defaults])
+        rv.extend(("", "}"))
+
+        self.digest = root
+        self.output = rv
+        return rv
+
+
+def watch(path, args, interval=0.2, stream=sys.stderr, polls=None):
+    """
+    Render the file at path to args.output whenever it changes, until interrupted.
+    Each render is reported to stream, as are any problems, which leave the output as it was.
+
+    """
+    incremental = Incremental(path.stem, args)
+    seen = None
+    n = 0
+    while polls is None or n < polls:
+        n += 1
+        try:
+            stat = path.stat()
+            state = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            state = seen
+
+        if state != seen:
+            seen = state
+            start = time.perf_counter()
+            try:
+                text = path.read_text()
+                if args.interpolate:
+                    from utils.confuser import Conf
+                    text = Conf.loads(text).dumps()
+                rv = incremental.update(text)
+            except Exception as e:
+                print(f"{path}: {e}", file=stream)
+            else:
+                for problem in incremental.problems:
+                    print(problem.detail, file=stream)
+                if rv is not None:
+                    with sink(args.output) as output:
+                        write(rv, output)
+                    print(
+                        f"{path}: {incremental.changed} of {len(incremental.subtrees) or 1} parsed,"
+                        f" rendered in {(time.perf_counter() - start) * 1000:.0f} ms.",
+                        file=stream
+                    )
+
+        if polls is None or n < polls:
+            time.sleep(interval)
+
+
+class TestIncremental(unittest.TestCase):
+
+    text = textwrap.dedent("""
+    title = "Test"
+
+    [A]
+    [A.B]
+    [A.B.x]
+    target = "C"
+
+    [D]
+    label = "Dee"
+    [D.E]
+    [D.E.y]
+    target = "A"
+    weight = 2.0
+
+    [A.C]
+    fill = {"r" = 255, "g" = 0, "b" = 0}
+    """)
+
+    def render(self, text, args=None):
+        args = args or parser().parse_args([])
+        return list(lines(Model.loads(text, args.library), "test", args))
+
+    def test_equivalent(self):
+        path = pathlib.Path(__file__).parent.parent.joinpath("design", "taxonomy.toml")
+        for text in (self.text, path.read_text()):
+            with self.subTest(text=text[:16]):
+                self.assertEqual(self.render(text), Incremental("test").update(text))
+
+    @unittest.skipUnless(importlib.util.find_spec("tomllib"), "Needs tomllib")
+    def test_scan(self):
+        "Headers found by scanning only what changed are those of the whole text."
+        incremental = Incremental("test")
+        edits = [
+            self.text,
+            self.text.replace("[D.E]", "[D.F]\n[D.E]"),
+            self.text.replace('label = "Dee"', "label = \'\'\'\n[X]\n\'\'\'"),
+            self.text.replace('label = "Dee"', "label = \'\'\'\n[X]"),
+            "[Z]\n" + self.text,
+            self.text.replace("\n[A.C]", ""),
+            self.text,
+        ]
+        for text in edits:
+            with self.subTest(text=text):
+                try:
+                    incremental.update(text)
+                except ValueError:
+                    self.assertIsNone(incremental.text)
+                else:
+                    self.assertEqual(list(incremental.scanner.spans(text)), incremental.spans)
+
+        incremental.scan(self.text)
+        spans, touched = incremental.scan(self.text.replace('label = "Dee"', 'label = "Delta"'))
+        self.assertEqual({"D"}, touched)
+
+    @unittest.skipUnless(importlib.util.find_spec("tomllib"), "Needs tomllib")
+    def test_changed(self):
+        incremental = Incremental("test")
+        incremental.update(self.text)
+        self.assertEqual(2, incremental.changed)
+
+        rv = incremental.update(self.text)
+        self.assertEqual(0, incremental.changed)
+        self.assertIs(incremental.output, rv)
+
+        text = self.text.replace('label = "Dee"', 'label = "Delta"')
+        self.assertEqual(self.render(text), incremental.update(text))
+        self.assertEqual(1, incremental.changed)
+
+    @unittest.skipUnless(importlib.util.find_spec("tomllib"), "Needs tomllib")
+    def test_names(self):
+        "Arcs in unchanged groups are resolved again when Nodes come or go."
+        incremental = Incremental("test")
+        incremental.update(self.text)
+        text = self.text + "[D.E.C]\n"
+        text = text.replace('target = "A"', 'target = "C"')
+        self.assertEqual(self.render(text), incremental.update(text))
+
+        incremental.update(self.text)
+        text = self.text + "[C]\n"
+        self.assertEqual(self.render(text), incremental.update(text))
+        self.assertEqual(1, incremental.changed)
+        self.assertIn("C", incremental.subtrees["A"].model.forward["A.B"])
+
+    def test_defaults(self):
+        "Lines already drawn are drawn again when the common style changes."
+        incremental = Incremental("test")
+        incremental.update(self.text)
+        text = self.text + "".join(
+            f'[G{i}]\nfill = {{"r" = 255, "g" = 0, "b" = 0}}\n' for i in range(8)
+        )
+        self.assertEqual(self.render(text), incremental.update(text))
+
+    def test_problems(self):
+        incremental = Incremental("test")
+        text = self.text.replace('target = "C"', 'target = "Z"')
+        self.assertIsNone(incremental.update(text))
+        self.assertEqual(["dangling"], [i.kind for i in incremental.problems])
+        self.assertEqual(self.render(self.text), incremental.update(self.text))
+        self.assertRaises(ValueError, incremental.update, self.text + "[title]\n")
+
+    def test_fallback(self):
+        args = parser().parse_args(["--cluster"])
+        incremental = Incremental("test", args)
+        self.assertFalse(incremental.incremental)
+        self.assertEqual(self.render(self.text, args), incremental.update(self.text))
+
+    @unittest.skipUnless(importlib.util.find_spec("toml"), "Needs toml")
+    def test_library(self):
+        args = parser().parse_args(["--library", "toml"])
+        incremental = Incremental("test", args)
+        self.assertFalse(incremental.incremental)
+        self.assertEqual(self.render(self.text, args), incremental.update(self.text))
+
+    def test_watch(self):
+        with tempfile.TemporaryDirectory() as parent:
+            path = pathlib.Path(parent, "test.toml")
+            path.write_text(self.text)
+            output = pathlib.Path(parent, "test.dot")
+            args = parser().parse_args(["--output", str(output), str(path)])
+            stream = io.StringIO()
+            watch(path, args, interval=0, stream=stream, polls=2)
+            self.assertEqual("\n".join(self.render(self.text)) + "\n", output.read_text())
+            self.assertEqual(1, len(stream.getvalue().splitlines()))